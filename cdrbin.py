@@ -0,0 +1,286 @@
+# -----------------------------------------------------------
+# fixed-width binary call detail record (CDR) format. each
+# record holds the CDR fields as numbers rather than quoted
+# text so that files can be memory mapped as a numpy
+# structured array and sliced or filtered without parsing.
+#
+# a file is a 64 byte header followed by the records
+#
+# | Field       | Type      | Description                         |
+# |-------------|-----------|-------------------------------------|
+# | caller      | int64     | calling number without the +        |
+# | called      | int64     | called number without the +         |
+# | timestamp   | int64     | call date and time, seconds since   |
+# |             |           | 1970-01-01 00:00:00 local time      |
+# | cell_id     | int64     | ID of cell tower                    |
+# | lat         | float64   | latitude call made from             |
+# | lng         | float64   | longitude call made from            |
+# | imei        | int64     | optional IMEI of the calling phone  |
+# | record_id   | 16 bytes  | UUID of the record                  |
+# | duration    | int32     | in seconds                          |
+# | ring_time   | uint8     | seconds before answer               |
+# | network     | uint8     | index into data.operators           |
+# | call_type   | 1 byte    | M mobile or F fixed                 |
+# | country     | 3 bytes   | country of origin e.g. GBR          |
+#
+# https://github.com/FixTheCode CC0 1.0 Universal
+# -----------------------------------------------------------
+import os
+import sys
+import csv
+import argparse
+import itertools
+
+import numpy as np
+
+import data
+
+MAGIC = b'CDRB'
+VERSION = 1
+HEADER_SIZE = 64
+
+# header flag set when records include the IMEI field
+FLAG_IMEI = 1
+
+# network code written for operators not in data.operators
+UNKNOWN_NETWORK = 255
+
+# number of records converted together from or to CSV
+BLOCK_SIZE = 10000
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u2'),
+    ('flags', '<u2'),
+    ('record_size', '<u4'),
+    ('reserved', 'V52')
+])
+
+
+def get_dtype(imei=False):
+    """ the numpy structured dtype of a record, with or without IMEI """
+    fields = [
+        ('caller', '<i8'),
+        ('called', '<i8'),
+        ('timestamp', '<i8'),
+        ('cell_id', '<i8'),
+        ('lat', '<f8'),
+        ('lng', '<f8')
+    ]
+    if imei:
+        fields.append(('imei', '<i8'))
+    fields += [
+        ('record_id', 'u1', (16,)),
+        ('duration', '<i4'),
+        ('ring_time', 'u1'),
+        ('network', 'u1'),
+        ('call_type', 'S1'),
+        ('country', 'S3')
+    ]
+    return np.dtype(fields)
+
+
+def get_header(imei=False) -> bytes:
+    """ the 64 byte file header """
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['flags'] = FLAG_IMEI if imei else 0
+    header['record_size'] = get_dtype(imei).itemsize
+    return header.tobytes()
+
+
+def read_header(file_name: str):
+    """
+    read and validate the header of a binary CDR file, returning the
+    record dtype
+
+    """
+    try:
+        with open(file_name, 'rb') as f:
+            header = np.frombuffer(f.read(HEADER_SIZE), dtype=HEADER_DTYPE)
+    except (FileNotFoundError):
+        raise SystemExit('File ' + file_name + ' not found.')
+    except (ValueError):
+        raise SystemExit('File ' + file_name + ' is not a binary CDR file.')
+    if header['magic'][0] != MAGIC:
+        raise SystemExit('File ' + file_name + ' is not a binary CDR file.')
+    if header['version'][0] != VERSION:
+        raise SystemExit('File ' + file_name + ' is binary CDR version ' +
+                         str(header['version'][0]) + ', expected ' +
+                         str(VERSION) + '.')
+    dtype = get_dtype(bool(header['flags'][0] & FLAG_IMEI))
+    if header['record_size'][0] != dtype.itemsize:
+        raise SystemExit('File ' + file_name + ' has an invalid record size.')
+    return dtype
+
+
+def read_cdrs(file_name: str, mode='r'):
+    """
+    memory map a binary CDR file as a numpy structured array. nothing is
+    read until records are accessed, so slices and filters of very large
+    files only touch the pages they need e.g.
+
+        cdrs = cdrbin.read_cdrs('cdr.bin')
+        long_calls = cdrs[cdrs['duration'] > 300]
+
+    """
+    dtype = read_header(file_name)
+    records = (os.path.getsize(file_name) - HEADER_SIZE) // dtype.itemsize
+    if records == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(file_name, dtype=dtype, mode=mode,
+                     offset=HEADER_SIZE, shape=(records,))
+
+
+def from_batch(batch: dict):
+    """
+    convert a block of records created by gencdr.get_random_cdr_batch into
+    a structured array of binary records
+
+    """
+    records = np.zeros(len(batch['cell_id']), dtype=get_dtype(
+        'imei' in batch))
+    for name in ('caller', 'called', 'cell_id', 'lat', 'lng', 'imei',
+                 'record_id', 'duration', 'ring_time', 'network'):
+        if name in batch:
+            records[name] = batch[name]
+    records['timestamp'] = batch['timestamp'].astype('datetime64[s]').astype(
+        np.int64)
+    records['call_type'] = b'M'
+    records['country'] = b'GBR'
+    return records
+
+
+def to_batch(records) -> dict:
+    """
+    convert binary records to the columns of gencdr.get_random_cdr_batch,
+    so that they can be formatted by gencdr.format_cdr_batch
+
+    """
+    batch = {name: records[name] for name in records.dtype.names
+             if name not in ('timestamp', 'call_type', 'country')}
+    batch['timestamp'] = records['timestamp'].astype('datetime64[s]')
+    return batch
+
+
+def from_csv_rows(rows: list, header: list):
+    """
+    convert rows of a CDR CSV file, as lists of field values, into a
+    structured array of binary records. the header names the fields, which
+    are those written by gencdr.py
+
+    """
+    field = {name: i for i, name in enumerate(header)}
+    imei = 'IMEI' in field
+    records = np.zeros(len(rows), dtype=get_dtype(imei))
+    if not rows:
+        return records
+    columns = list(zip(*rows))
+
+    def column(name):
+        return columns[field[name]]
+
+    records['call_type'] = column('Call Type')
+    records['caller'] = [int(n.lstrip('+')) for n in
+                         column('Customer Identifier')]
+    records['called'] = [int(n.lstrip('+')) for n in
+                         column('Telephone Number Dialed')]
+    records['timestamp'] = np.array(
+        [d[6:10] + '-' + d[3:5] + '-' + d[0:2] + 'T' + t
+         for d, t in zip(column('Call Date'), column('Call Time'))],
+        dtype='datetime64[s]').astype(np.int64)
+    records['duration'] = column('Duration')
+    records['country'] = column('Country of Origin')
+    networks = {name: code for code, name in enumerate(data.operators)}
+    records['network'] = [networks.get(name, UNKNOWN_NETWORK)
+                          for name in column('Network')]
+    records['ring_time'] = [int(t or 0) for t in column('Ring Time')]
+    records['record_id'] = np.frombuffer(
+        bytes.fromhex(''.join(column('RecordID')).replace('-', '')),
+        dtype=np.uint8).reshape(len(rows), 16)
+    if imei:
+        records['imei'] = [int(n or 0) for n in column('IMEI')]
+    records['cell_id'] = column('Cell ID')
+    records['lat'] = column('Cell Lat')
+    records['lng'] = column('Cell Long')
+    return records
+
+
+def main():
+
+    def convert_csv(file_name: str, output_name: str):
+        """
+        convert a CDR CSV file created by gencdr.py to a binary CDR file,
+        BLOCK_SIZE records at a time
+
+        """
+        try:
+            f = open(file_name, 'r', newline='')
+        except (FileNotFoundError):
+            raise SystemExit('File ' + file_name + ' not found.')
+        reader = csv.reader(f)
+        header = next(reader, [])
+        with open(output_name, 'wb') as output:
+            output.write(get_header('IMEI' in header))
+            while True:
+                rows = list(itertools.islice(reader, BLOCK_SIZE))
+                if not rows:
+                    break
+                try:
+                    output.write(from_csv_rows(rows, header).tobytes())
+                except (KeyError, ValueError, IndexError):
+                    raise SystemExit('File ' + file_name +
+                                     ' is not a valid CDR CSV file.')
+        f.close()
+
+    def print_csv(file_name: str, start: int, count):
+        """ print a range of records of a binary CDR file as CSV """
+        import gencdr
+
+        cdrs = read_cdrs(file_name)
+        end = len(cdrs) if count is None else min(start + count, len(cdrs))
+        imei = 'imei' in cdrs.dtype.names
+        sys.stdout.write((gencdr.CDR_IMEI_HEADER if imei
+                          else gencdr.CDR_HEADER) + '\n')
+        for first in range(start, end, BLOCK_SIZE):
+            records = cdrs[first:min(first + BLOCK_SIZE, end)]
+            sys.stdout.write(gencdr.format_cdr_batch(to_batch(records)))
+
+    try:
+        if (args.c):
+            convert_csv(args.i, args.c)
+        else:
+            print_csv(args.i, int(args.start),
+                      None if args.count is None else int(args.count))
+    except (ValueError):
+        raise SystemExit(
+            'Incorrect usage. Check command line options.')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-i',
+        required=True,
+        metavar='FILE',
+        help='input file, binary unless converting with -c')
+    parser.add_argument(
+        '-c',
+        required=False,
+        metavar='FILE',
+        help='convert the CSV input file to this binary CDR file')
+    parser.add_argument(
+        '--start',
+        default=0,
+        metavar='INT',
+        help='first record to print')
+    parser.add_argument(
+        '--count',
+        required=False,
+        metavar='INT',
+        help='number of records to print')
+    args = parser.parse_args()
+
+    main()
@@ -4,195 +4,1156 @@
 # https://github.com/FixTheCode CC0 1.0 Universal
 # -----------------------------------------------------------
 import random
+import os
+import csv
+import itertools
 import sys
+import time
 import argparse
+import functools
+import multiprocessing
 import uuid
+import gzip
+import bz2
+import lzma
 from datetime import datetime, timedelta
 from random import randint
 
+import numpy as np
+
+import cdrbin
 import data
 import geo
+import geohash
 
+# number of records generated and formatted together by the batch engine
+BATCH_SIZE = 10000
 
-def main():
+# number of records in each shard when generating with multiple workers
+SHARD_SIZE = 100000
+
+# buffer size of the output file writer
+OUTPUT_BUFFER_SIZE = 16 * 1024 * 1024
+
+# compressed output is chosen by the extension of the output file. gzip
+# uses level 6 rather than 9 as it is several times faster for a few
+# percent larger files
+COMPRESSORS = {
+    '.gz': functools.partial(gzip.open, compresslevel=6),
+    '.bz2': bz2.open,
+    '.xz': lzma.open
+}
+
+# digit counts used to truncate random phone numbers to 13 characters
+POWERS_OF_TEN = 10 ** np.arange(19, dtype=np.int64)
+
+# Call Time strings for every second of the day
+CALL_TIMES = np.array(['%02d:%02d:%02d' % (s // 3600, s // 60 % 60, s % 60)
+                       for s in range(86400)])
+
+# hex digits and the positions of the hex digits in a formatted RecordID
+HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+UUID_HEX_POSITIONS = np.array(
+    [i for i in range(36) if i not in (8, 13, 18, 23)])
+
+CDR_HEADER = ('"Call Type","Customer Identifier","Telephone Number Dialed",'
+              '"Call Date","Call Time","Duration","Country of Origin",'
+              '"Network","Ring Time","RecordID","Cell ID","Cell Lat",'
+              '"Cell Long"')
+
+CDR_FORMAT = ('"M","+%s","+%s","%s","%s","%s","GBR","%s","%s","%s","%s",'
+              '"%s","%s"')
+
+# layout with the optional IMEI field after the RecordID
+CDR_IMEI_HEADER = CDR_HEADER.replace('"RecordID",', '"RecordID","IMEI",')
+CDR_IMEI_FORMAT = ('"M","+%s","+%s","%s","%s","%s","GBR","%s","%s","%s",'
+                   '"%s","%s","%s","%s"')
+
+# the optional Geohash field added after the Cell Long
+CDR_GEOHASH_HEADER = ',"Geohash"'
+CDR_GEOHASH_FORMAT = ',"%s"'
+
+# weights applied to the digits of a 14 digit IMEI by the Luhn algorithm
+LUHN_WEIGHTS = np.array([1, 2] * 7)
+
+
+def get_random_phone_numbers(rng, size: int):
+    """
+    generate an array of random UK mobile numbers. numbers are held as
+    int64 without the leading + and are truncated to 12 digits, matching
+    the 13 character numbers created one at a time by
+    get_random_phone_number
+
+    """
+    prefixes = np.array([int(p[1:]) for p in data.mobile_numbers],
+                        dtype=np.int64)
+    prefix_digits = np.array([len(p) - 1 for p in data.mobile_numbers])
+    choice = rng.integers(len(prefixes), size=size)
+    number = rng.integers(100, 10000000000, size=size, dtype=np.int64)
+    digits = np.searchsorted(POWERS_OF_TEN, number, side='right')
+    excess = np.maximum(prefix_digits[choice] + digits - 12, 0)
+    number //= POWERS_OF_TEN[excess]
+    digits -= excess
+    return prefixes[choice] * POWERS_OF_TEN[digits] + number
+
+
+def get_call_window(centre=None, days=60) -> tuple:
+    """
+    return the start and end of a window of whole days, centred on a date
+    and by default today, from which call dates are drawn
+
+    """
+    if centre is None:
+        centre = datetime.now()
+    start = datetime(centre.year, centre.month, centre.day) - \
+        timedelta(days=int(days) // 2)
+    return (start, start + timedelta(days=int(days)))
+
+
+def get_random_timestamps(rng, size: int, start_date, end_date):
+    """
+    generate an array of random timestamps, as whole seconds, in the days
+    between two dates
+
+    """
+    days_between = (end_date - start_date).days
+    start = np.datetime64(start_date, 's')
+    return start + rng.integers(0, days_between * 86400, size=size)
+
+
+def get_random_record_ids(rng, size: int, first=0, now=None):
+    """
+    generate an array of size random 16 byte RecordIDs with the version and
+    variant bits of a UUID. when now, the time the records are created, is
+    given time ordered, UUIDv7 style, IDs are created for the records
+    numbered from first. the 48 bit millisecond timestamp is now plus the
+    record number divided by 4096 and the remainder fills the 12 bit rand_a
+    field, so IDs increase with the record number and inserts into an index
+    on RecordID are sequential. records may be numbered from below 0 to
+    come before record 0
+
+    """
+    ids = np.frombuffer(rng.bytes(16 * size), dtype=np.uint8).reshape(
+        size, 16).copy()
+    if now is None:
+        ids[:, 6] = ids[:, 6] & 0x0f | 0x40
+    else:
+        number = np.arange(first, first + size, dtype=np.int64)
+        millis = int(now.timestamp() * 1000) + (number >> 12)
+        shifts = np.arange(40, -1, -8, dtype=np.int64)
+        ids[:, :6] = (millis[:, None] >> shifts) & 0xff
+        ids[:, 6] = 0x70 | (number >> 8) & 0x0f
+        ids[:, 7] = number & 0xff
+    ids[:, 8] = ids[:, 8] & 0x3f | 0x80
+    return ids
+
+
+def format_record_ids(ids) -> list:
+    """
+    hex format an array of 16 byte RecordIDs as UUID strings in one pass
+    e.g. 0ee76862-bdd7-4dae-8d37-57378fac6978
+
+    """
+    size = len(ids)
+    digits = np.empty((size, 32), dtype=np.uint8)
+    digits[:, 0::2] = HEX_DIGITS[ids >> 4]
+    digits[:, 1::2] = HEX_DIGITS[ids & 0x0f]
+    formatted = np.full((size, 36), ord('-'), dtype=np.uint8)
+    formatted[:, UUID_HEX_POSITIONS] = digits
+    text = formatted.tobytes().decode('ascii')
+    return [text[i:i + 36] for i in range(0, size * 36, 36)]
+
+
+def get_luhn_checkdigits(numbers):
+    """
+    compute the Luhn algorithm check digits for an array of 14 digit
+    numbers, using array arithmetic over the digits of every number
+
+    """
+    digits = numbers[:, None] // POWERS_OF_TEN[13::-1] % 10
+    weighted = digits * LUHN_WEIGHTS
+    weighted -= 9 * (weighted > 9)
+    return (10 - weighted.sum(axis=1) % 10) % 10
+
+
+def is_valid_luhn(numbers):
+    """
+    validate a sequence of numbers, held as strings, with the Luhn
+    algorithm and return a boolean array. numbers are right aligned with
+    leading zeros, which do not change a Luhn checksum, so numbers of any
+    length up to 19 digits are checked together. values that are empty,
+    longer than 19 characters or not all digits are invalid
+
+    """
+    numbers = np.char.encode(np.asarray(numbers, dtype=str), 'ascii',
+                             'replace')
+    length = np.char.str_len(numbers)
+    valid = (length > 0) & (length <= 19) & np.char.isdigit(numbers)
+    padded = np.char.rjust(np.where(valid, numbers, b'0'), 19, b'0')
+    digits = padded.astype('S19').view(np.uint8).reshape(-1, 19) - 48
+    weighted = digits.astype(np.int64) * np.tile([1, 2], 10)[:19]
+    weighted -= 9 * (weighted > 9)
+    return valid & (weighted.sum(axis=1) % 10 == 0)
+
+
+def get_random_imei_numbers(rng, size: int):
+    """
+    generate an array of random International Mobile Station Equipment
+    Identity numbers as int64. each is an 8 digit TAC code from
+    data.imie_type_identifier, a 6 digit serial number and a Luhn check
+    digit
+
+    """
+    tacs = np.array(data.imie_type_identifier, dtype=np.int64)
+    numbers = tacs[rng.integers(len(tacs), size=size)] * 1000000 + \
+        rng.integers(1, 999999, size=size)
+    return numbers * 10 + get_luhn_checkdigits(numbers)
+
+
+def get_random_cdr_batch(rng, first: int, size: int, x0: float, y0: float,
+                         meters: int, boundary_coords=None,
+                         window=None, record_ids='uuid4',
+                         imei=False, geohash_precision=None,
+                         created=None) -> dict:
+    """
+    generate a block of random CDR records as numpy columns. locations are
+    drawn within meters of the coordinate, and within the boundary when one
+    is given, and call dates within the window from get_call_window.
+    record_ids is uuid4 for random RecordIDs or uuid7 for time ordered
+    RecordIDs stamped with created, by default now. imei adds an IMEI
+    column and a geohash precision adds a Geohash column
+
+    """
+    if boundary_coords:
+        lat, lng = geo.get_prepared_boundary(boundary_coords).get_sampler(
+        ).sample(size, rng, x0, y0, meters)
+    else:
+        lat, lng = geo.get_random_locations(x0, y0, meters, size, rng)
+
+    if window is None:
+        window = get_call_window()
+    if record_ids == 'uuid7' and created is None:
+        created = datetime.now()
+    batch = {
+        'caller': get_random_phone_numbers(rng, size),
+        'called': get_random_phone_numbers(rng, size),
+        'timestamp': get_random_timestamps(rng, size, *window),
+        'duration': rng.integers(1, 600, size=size),
+        'network': rng.integers(len(data.operators), size=size,
+                                dtype=np.uint8),
+        'ring_time': rng.integers(1, 10, size=size),
+        'record_id': get_random_record_ids(
+            rng, size, first, created if record_ids == 'uuid7' else None),
+        'cell_id': np.arange(first, first + size),
+        'lat': lat,
+        'lng': lng
+    }
+    if imei:
+        batch['imei'] = get_random_imei_numbers(rng, size)
+    if geohash_precision:
+        batch['geohash'] = geohash.encode(lat, lng, geohash_precision)
+    return batch
+
+
+def get_block_rng(seed: int, block: int):
+    """
+    counter-based random generator for a block of BATCH_SIZE records. the
+    Philox key is the run seed and the block number is held in the upper
+    128 bits of the counter, so every block has its own stream that can be
+    created directly without generating the blocks before it
+
+    """
+    return np.random.Generator(
+        np.random.Philox(key=seed, counter=block << 128))
+
+
+def get_random_cdr_range(seed: int, start: int, count: int, x0: float,
+                         y0: float, meters: int, boundary_coords=None,
+                         window=None, record_ids='uuid4', imei=False,
+                         geohash_precision=None, created=None):
+    """
+    generate the records numbered start to start + count - 1 of a seeded
+    run as a series of batches. record k is drawn from block k // BATCH_SIZE
+    and so depends only on the seed and k, which means any range of a run
+    can be regenerated on its own and ranges created separately agree when
+    given the same window and created time
+
+    """
+    end = start + count
+    if created is None:
+        created = datetime.now()
+    for block in range(start // BATCH_SIZE, (end - 1) // BATCH_SIZE + 1):
+        first = block * BATCH_SIZE
+        batch = get_random_cdr_batch(
+            get_block_rng(seed, block), first, BATCH_SIZE, x0, y0, meters,
+            boundary_coords, window, record_ids, imei, geohash_precision,
+            created)
+        if first < start or first + BATCH_SIZE > end:
+            lo, hi = max(start - first, 0), min(end - first, BATCH_SIZE)
+            batch = slice_batch(batch, lo, hi)
+            if boundary_coords:
+                # the whole block is sampled so records depend only on the
+                # seed, but only the records in the range are counted
+                geo.get_prepared_boundary(boundary_coords).get_sampler(
+                ).discard(BATCH_SIZE - (hi - lo))
+        yield batch
+
+
+def slice_batch(batch: dict, start: int, stop: int) -> dict:
+    """ return the records start to stop - 1 of a batch """
+    return {name: column[start:stop] for name, column in batch.items()}
 
-    def get_checkdigit(number) -> int:
-        """ Generate the Luhn algorithm check digit to append to the number provided. """
-        digit = checksum(number + '0')
-        return (10 - digit) % 10
-
-    def checksum(number) -> int:
-        """ Compute the Luhn algorithm checksum to validate the number provided. """
-        digits = list(map(int, number))
-        odd_sum = sum(digits[-1::-2])
-        even_sum = sum([sum(divmod(2 * d, 10))
-                        for d in digits[-2::-2]])
-        return (odd_sum + even_sum) % 10
-
-    def get_random_phone_number() -> str:
-        """ generate a random UK mobile number """
-        mobile = random.choice(
-            data.mobile_numbers) + str(random.randrange(100, 10000000000))
-        return str(mobile[:13])
-
-    def get_random_IMEI_number() -> str:
+
+def format_call_dates(timestamps) -> tuple:
+    """
+    return the Call Date and Call Time strings for an array of timestamps.
+    dates come from a table of the few days the timestamps cover and times
+    from the CALL_TIMES table indexed by the second of the day, rather
+    than formatting each timestamp
+
+    """
+    if len(timestamps) == 0:
+        return ([], [])
+    days = timestamps.astype('datetime64[D]')
+    seconds = (timestamps - days).astype(np.int64)
+    first = days.min()
+    dates = np.array([d.strftime('%d/%m/%Y') for d in np.arange(
+        first, days.max() + 1).tolist()])
+    return (dates[(days - first).astype(np.int64)].tolist(),
+            CALL_TIMES[seconds].tolist())
+
+
+def get_cdr_fields(batch: dict) -> list:
+    """
+    convert the columns of a block of CDR records created by
+    get_random_cdr_batch into lists of the values written to the CSV
+    fields, other than the constant Call Type and Country of Origin and
+    the + of the phone numbers
+
+    """
+    dates, times = format_call_dates(batch['timestamp'])
+    networks = np.array(data.operators)[batch['network']].tolist()
+    columns = [batch['caller'].tolist(),
+               batch['called'].tolist(),
+               dates,
+               times,
+               batch['duration'].tolist(),
+               networks,
+               batch['ring_time'].tolist(),
+               format_record_ids(batch['record_id']),
+               batch['cell_id'].tolist(),
+               batch['lat'].tolist(),
+               batch['lng'].tolist()]
+    if 'imei' in batch:
+        columns.insert(8, batch['imei'].tolist())
+    if 'geohash' in batch:
+        columns.append(batch['geohash'].tolist())
+    return columns
+
+
+def format_cdr_batch(batch: dict) -> str:
+    """
+    format a block of CDR records created by get_random_cdr_batch as
+    quoted CSV lines, matching the layout of the tracking records
+
+    """
+    layout = get_cdr_layout('imei' in batch, 'geohash' in batch)[1]
+    return '\n'.join([layout % row
+                      for row in zip(*get_cdr_fields(batch))]) + '\n'
+
+
+def get_cdr_layout(imei=False, geohash=False) -> tuple:
+    """
+    return the CSV header and record format, with the optional IMEI field
+    after the RecordID and Geohash field after the Cell Long
+
+    """
+    if imei:
+        header, layout = (CDR_IMEI_HEADER, CDR_IMEI_FORMAT)
+    else:
+        header, layout = (CDR_HEADER, CDR_FORMAT)
+    if geohash:
+        return (header + CDR_GEOHASH_HEADER, layout + CDR_GEOHASH_FORMAT)
+    return (header, layout)
+
+
+def get_output_header(output_format='csv', imei=False,
+                      geohash=False) -> tuple:
+    """
+    return the header and record size for the csv or fixed-width binary
+    output format. CSV records do not have a fixed size and binary records
+    have no Geohash field
+
+    """
+    if output_format == 'binary':
+        return (cdrbin.get_header(imei), cdrbin.get_dtype(imei).itemsize)
+    return (get_cdr_layout(imei, geohash)[0], None)
+
+
+def format_batch(batch: dict, output_format='csv'):
+    """ format a block of CDR records as CSV text or binary records """
+    if output_format == 'binary':
+        return cdrbin.from_batch(batch).tobytes()
+    return format_cdr_batch(batch)
+
+
+def format_record(record: str, output_format='csv', imei=False):
+    """ format a CSV line, such as a tracking record, as CSV or binary """
+    if output_format == 'binary':
+        header = CDR_IMEI_HEADER if imei else CDR_HEADER
+        return cdrbin.from_csv_rows(list(csv.reader([record])),
+                                    header[1:-1].split('","')).tobytes()
+    return record
+
+
+class CDRWriter:
+    """
+    buffered binary writer for CSV or fixed-width binary records. records
+    are written to stdout or to a file that is compressed when its name
+    ends in .gz, .bz2 or .xz. output files can be rotated after a number of
+    records or bytes, each file being named with a sequence number before
+    its extensions e.g. cdr-0000.csv.gz, and every file starts with the
+    header. blocks of records are split between records so a file rotated
+    by size holds no more than the size, counted before compression,
+    unless its header and first record are larger. binary records are
+    written as bytes of record_size
+
+    """
+
+    def __init__(self, file_name=None, rotate_records=None,
+                 rotate_bytes=None, header=CDR_HEADER, record_size=None):
+        self.file_name = file_name
+        self.rotate_records = int(rotate_records or 0)
+        self.rotate_bytes = parse_size(rotate_bytes or 0)
+        self.record_size = record_size
+        if isinstance(header, str):
+            header = (header + '\n').encode()
+        self.header = header
+        self.records = 0
+        self.bytes = 0
+        self.files = 0
+        self.started = time.perf_counter()
+        self.rotate = False
+        self.open_file()
+
+    def get_file_name(self) -> str:
+        if not (self.rotate_records or self.rotate_bytes):
+            return self.file_name
+        path, name = os.path.split(self.file_name)
+        stem, dot, extensions = name.partition('.')
+        return os.path.join(
+            path, stem + '-%04d' % self.files + dot + extensions)
+
+    def open_file(self):
+        if self.file_name is None:
+            sys.stdout.flush()
+            self.file = sys.stdout.buffer
+        else:
+            name = self.get_file_name()
+            opener = COMPRESSORS.get(os.path.splitext(name)[1])
+            if opener:
+                self.file = opener(name, 'wb')
+            else:
+                self.file = open(name, 'wb', buffering=OUTPUT_BUFFER_SIZE)
+        self.files += 1
+        self.file_records = 0
+        self.file_bytes = 0
+        self.write_bytes(self.header)
+
+    def write_bytes(self, output: bytes):
+        self.file.write(output)
+        self.file_bytes += len(output)
+        self.bytes += len(output)
+
+    def get_split(self, output: bytes, count: int) -> int:
+        """ the number of bytes of the first count records of a block """
+        if self.record_size:
+            return count * self.record_size
+        split = -1
+        for i in range(count):
+            split = output.index(b'\n', split + 1)
+        return split + 1
+
+    def get_fit(self, output: bytes, size: int) -> tuple:
+        """ the number and bytes of the whole records of a block in size """
+        if self.record_size:
+            count = size // self.record_size
+            return (count, count * self.record_size)
+        split = output.rfind(b'\n', 0, size) + 1
+        return (output.count(b'\n', 0, split), split)
+
+    def write(self, output, records: int):
         """
-        generate a random International Mobile Station Equipment Identity
-        IMEI number of 14 digits and check digit calculated using the Luhn
-        formula. Format is 8-digit TAC code + 6-digit serial number + check
-        digit
+        write a block of formatted records, rotating the output file when
+        it is full
 
         """
-        imie = str(random.choice(data.imie_type_identifier))
-        imie += str(random.randrange(1, 999999))
-        imie += str(get_checkdigit(imie))
-        return (imie)
-
-    def get_random_date(start_date, end_date):
-        """ generate a random date between two dates """
-        time_between = end_date - start_date
-        days_between = time_between.days
-        random_date = start_date + timedelta(
-            days=random.randrange(days_between),
-            hours=random.randrange(24),
-            minutes=random.randrange(60),
-            seconds=random.randrange(60))
-        return (random_date)
-
-    def get_random_location_tracking(x0, y0, miles, records, geojson):
+        if isinstance(output, str):
+            output = output.encode()
+        while records:
+            if self.rotate:
+                self.file.close()
+                self.open_file()
+                self.rotate = False
+            count = records
+            if self.rotate_records:
+                count = min(records, self.rotate_records - self.file_records)
+            split = len(output) if count == records else \
+                self.get_split(output, count)
+            room = self.rotate_bytes - self.file_bytes
+            if self.rotate_bytes and split > room:
+                fit, fit_split = self.get_fit(output, max(room, 0))
+                if fit == 0 and self.file_records:
+                    # the next record starts a new file
+                    self.rotate = True
+                    continue
+                count, split = (fit, fit_split) if fit else \
+                    (1, self.get_split(output, 1))
+            chunk, output = output[:split], output[split:]
+            self.write_bytes(chunk)
+            self.file_records += count
+            self.records += count
+            records -= count
+            self.rotate = bool(
+                (self.rotate_records and
+                 self.file_records >= self.rotate_records) or
+                (self.rotate_bytes and self.file_bytes >= self.rotate_bytes))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file_name is None:
+            self.file.flush()
+        else:
+            self.file.close()
+
+    def report(self) -> str:
+        """ summarise the records and bytes written and their rates """
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return ('wrote ' + str(self.records) + ' records, ' +
+                str(self.bytes) + ' bytes to ' + str(self.files) +
+                ' file(s) in ' + '%.2f' % elapsed + 's: ' +
+                '%.0f' % (self.records / elapsed) + ' records/s, ' +
+                '%.1f' % (self.bytes / elapsed / 1048576) + ' MB/s')
+
+
+def parse_size(size) -> int:
+    """ convert a size such as 512, 64K, 100M or 2G to a number of bytes """
+    size = str(size).strip().upper()
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if size[-1:] in units:
+        return int(size[:-1]) * units[size[-1]]
+    return int(size)
+
+
+def init_shard_worker(geojson):
+    """
+    parse the boundary once in each worker process rather than once per
+    shard. the boundary is a GeoJSON file name or a prepared geo.Boundary
+
+    """
+    global shard_boundary_coords
+    shard_boundary_coords = None
+    if isinstance(geojson, str):
+        shard_boundary_coords = geo.load_boundary(geojson)
+    elif (geojson):
+        shard_boundary_coords = geojson
+
+
+def generate_shard(shard: tuple):
+    """
+    generate one shard of random CDR records. records are a function of
+    the seed and their record number only, so a shard is reproducible
+    whichever worker or how many workers create it. when a file name is
+    given the shard is written to that file with a header, otherwise the
+    formatted records are returned
+
+    """
+    (number, first, size, x0, y0, seed, window, record_ids, imei,
+     geohash_precision, created, output_format, file_name) = shard
+    output = []
+    if file_name:
+        header, record_size = get_output_header(output_format, imei,
+                                                bool(geohash_precision))
+        writer = CDRWriter(file_name, header=header, record_size=record_size)
+    for batch in get_random_cdr_range(seed, first, size, x0, y0, 8000,
+                                      shard_boundary_coords, window,
+                                      record_ids, imei, geohash_precision,
+                                      created):
+        if file_name:
+            writer.write(format_batch(batch, output_format),
+                         len(batch['cell_id']))
+        else:
+            output.append(format_batch(batch, output_format))
+    if file_name:
+        writer.close()
+        return ''
+    return (b'' if output_format == 'binary' else '').join(output)
+
+
+def get_checkdigit(number) -> int:
+    """ Generate the Luhn algorithm check digit to append to the number provided. """
+    digit = checksum(number + '0')
+    return (10 - digit) % 10
+
+
+def checksum(number) -> int:
+    """ Compute the Luhn algorithm checksum to validate the number provided. """
+    digits = list(map(int, number))
+    odd_sum = sum(digits[-1::-2])
+    even_sum = sum([sum(divmod(2 * d, 10))
+                    for d in digits[-2::-2]])
+    return (odd_sum + even_sum) % 10
+
+
+def get_random_phone_number() -> str:
+    """ generate a random UK mobile number """
+    mobile = random.choice(
+        data.mobile_numbers) + str(random.randrange(100, 10000000000))
+    return str(mobile[:13])
+
+
+def get_random_IMEI_number() -> str:
+    """
+    generate a random International Mobile Station Equipment Identity
+    IMEI number of 14 digits and check digit calculated using the Luhn
+    formula. Format is 8-digit TAC code + 6-digit serial number + check
+    digit
+
+    """
+    imie = str(random.choice(data.imie_type_identifier))
+    imie += '%06d' % random.randrange(1, 999999)
+    imie += str(get_checkdigit(imie))
+    return (imie)
+
+
+def get_random_location_tracking(x0, y0, miles, records, geojson=None,
+                                 window=None, imei=False,
+                                 geohash_precision=None, record_ids='uuid4',
+                                 created=None, first=0):
+    """
+    generate a small CDR data set for mobile phone movement within an
+    approximate specified radius of miles. this data simulates mobile
+    phone location by connection to cell towers or GPS data. results
+    can be plotted on a map.  locations can be constrained to be within
+    a geographic boundary for a provided GeoJSON file or prepared
+    geo.Boundary, in which case a location that would leave the boundary
+    is drawn again within both the radius and the boundary. the whole
+    track is drawn at once by geo.get_random_walk, and with a geohash
+    precision each record ends with the geohash of its location. with
+    record_ids uuid7 the RecordIDs are time ordered with the timestamp of
+    created, by default now, for the records numbered from first, as
+    get_random_record_ids creates. tracking
+    records follow on from each other so they are reproducible from the seed of
+    the random module but cannot be generated from an arbitrary record.
+    each record is yielded as a CSV line
+
+    """
+    meters = int(miles) * 1610
+    if isinstance(geojson, str):
+        geojson = geo.load_boundary(geojson)
+    rng = np.random.default_rng(np.random.randint(2 ** 32))
+    lats, lngs = geo.get_random_walk(x0, y0, meters, int(records), rng,
+                                     geojson)
+    if window is None:
+        window = get_call_window()
+    record_id_fields = None
+    if record_ids == 'uuid7':
+        record_id_fields = format_record_ids(get_random_record_ids(
+            rng, len(lats), first, created or datetime.now()))
+
+    phone_to_track = get_random_phone_number()
+    network = random.choice(data.operators)
+    imei_field = ''
+    if (imei):
+        imei_field = '"' + get_random_IMEI_number() + '",'
+    start_date, end_date = window
+    call_dates = [(start_date + timedelta(days=d)).strftime('%d/%m/%Y')
+                  for d in range((end_date - start_date).days)]
+    geohashes = [''] * len(lats)
+    if geohash_precision:
+        geohashes = [',"' + code + '"' for code in
+                     geohash.encode(lats, lngs, geohash_precision).tolist()]
+    for i, (x0, y0) in enumerate(zip(lats.tolist(), lngs.tolist())):
+        yield (
+            '"M",' +
+            '"' + str(phone_to_track) + '",' +
+            '"' + str(get_random_phone_number()) + '",' +
+            '"' + random.choice(call_dates) + '",' +
+            '"' + CALL_TIMES[random.randrange(86400)] + '",' +
+            '"' + str(random.randrange(1, 600)) + '",' +
+            '"GBR",' +
+            '"' + str(network) + '",' +
+            '"' + str(random.randrange(1, 10)) + '",' +
+            '"' + (record_id_fields[i] if record_id_fields else
+                   str(uuid.UUID(int=random.getrandbits(128), version=4))) +
+            '",' +
+            imei_field +
+            '"' + str(i) + '",' +
+            '"' + str(x0) + '",' +
+            '"' + str(y0) + '"' + geohashes[i] + '\n'
+        )
+
+
+def get_default_origin(seed: int) -> tuple:
+    """
+    the starting coordinate used when none is given, a random location
+    within 8000 meters of London drawn from the run seed
+
+    """
+    lat, lng = geo.get_random_locations(
+        data.places['London']['lat'],
+        data.places['London']['lng'],
+        8000, 1, np.random.default_rng(seed))
+    return (float(lat[0]), float(lng[0]))
+
+
+def concat_batches(batches: list) -> dict:
+    """ join a list of batches into a single batch """
+    if len(batches) == 1:
+        return batches[0]
+    return {name: np.concatenate([batch[name] for batch in batches])
+            for name in batches[0]}
+
+
+def generate_cdrs(count: int, origin=None, radius=8000, boundary=None,
+                  seed=None, start=0, batch_size=BATCH_SIZE, window=None,
+                  record_ids='uuid4', imei=False, geohash_precision=None,
+                  created=None):
+    """
+    generate count random CDR records as a stream of columnar batches of
+    up to batch_size records. batches are dicts of numpy columns as
+    created by get_random_cdr_batch. records are drawn within radius
+    meters of the origin latitude and longitude, by default a location
+    near London, and within the boundary when a GeoJSON file name or a
+    boundary prepared by geo.load_boundary is given. the same seed, origin
+    and window, and created time of uuid7 RecordIDs, produce the same
+    records as running gencdr.py with --seed e.g.
+
+        for batch in gencdr.generate_cdrs(1000000, seed=42,
+                                          batch_size=50000):
+            sink.write(batch['caller'], batch['lat'], batch['lng'])
+
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    if origin is None:
+        origin = get_default_origin(seed)
+    if isinstance(boundary, str):
+        boundary = geo.load_boundary(boundary)
+    x0, y0 = origin
+    batch_size = int(batch_size)
+
+    pending = []
+    pending_size = 0
+    for batch in get_random_cdr_range(int(seed), int(start), int(count),
+                                      x0, y0, radius, boundary, window,
+                                      record_ids, imei, geohash_precision,
+                                      created):
+        pending.append(batch)
+        pending_size += len(batch['cell_id'])
+        if pending_size < batch_size:
+            continue
+        batch = concat_batches(pending)
+        for first in range(0, pending_size - batch_size + 1, batch_size):
+            yield slice_batch(batch, first, first + batch_size)
+        remaining = pending_size % batch_size
+        pending = [slice_batch(batch, pending_size - remaining,
+                               pending_size)] if remaining else []
+        pending_size = remaining
+    if pending_size:
+        yield concat_batches(pending)
+
+
+def generate_cdr_records(count: int, **options):
+    """
+    generate count random CDR records one at a time as dicts keyed by the
+    CSV header, holding the same string values written by gencdr.py. the
+    options are those of generate_cdrs
+
+    """
+    for batch in generate_cdrs(count, **options):
+        header, layout = get_cdr_layout('imei' in batch,
+                                        'geohash' in batch)
+        names = header[1:-1].split('","')
+        for row in zip(*get_cdr_fields(batch)):
+            yield dict(zip(names, (layout % row)[1:-1].split('","')))
+
+
+def write_cdr_shards(start, records, x0, y0, geojson, workers, seed,
+                     window, record_ids, imei, geohash_precision,
+                     output_format, pattern, output, created=None):
+    """
+    generate random CDR records in shards of SHARD_SIZE using a pool of
+    worker processes. shards are either written to the output in order or,
+    when a file name pattern is given, each to its own file and the output
+    is not used. the pattern is formatted with the shard number e.g.
+    cdr-{:04}.csv
+
+    """
+    start = int(start)
+    end = start + int(records)
+    workers = int(workers or 1)
+    if created is None:
+        created = datetime.now()
+    shards = [(number, first, min(SHARD_SIZE, end - first),
+               x0, y0, seed, window, record_ids, imei, geohash_precision,
+               created, output_format,
+               pattern.format(number) if pattern else None)
+              for number, first in enumerate(
+                  range(start, end, SHARD_SIZE))]
+
+    if workers > 1:
+        with multiprocessing.Pool(workers, init_shard_worker,
+                                  (geojson,)) as pool:
+            for shard, records in zip(
+                    shards, pool.imap(generate_shard, shards)):
+                if not pattern:
+                    output.write(records, shard[2])
+    else:
+        init_shard_worker(geojson)
+        for shard in shards:
+            records = generate_shard(shard)
+            if not pattern:
+                output.write(records, shard[2])
+
+
+class RateLimiter:
+    """
+    token bucket that paces the emission of records to a target rate. the
+    bucket is kept in its virtual scheduling form: due is the time the next
+    record is due and a chunk of records may be sent once due, less the
+    time to refill capacity tokens, has been reached. the rate follows an
+    optional repeating profile of (seconds, multiplier) steps to create
+    bursts. when emission falls more than the bucket capacity behind, the
+    owed records are dropped from the schedule rather than sent as a burst
+
+    """
+
+    def __init__(self, rate: float, capacity: int, profile=None):
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.profile = profile or [(1, 1.0)]
+        if self.rate <= 0 or not any(seconds > 0 and multiplier > 0 for
+                                     seconds, multiplier in self.profile):
+            raise ValueError('rate must be greater than 0')
+        self.cycle = sum(seconds for seconds, multiplier in self.profile)
+        self.started = time.perf_counter()
+        self.due = self.started
+
+    def get_rate(self, at: float) -> float:
+        """ target rate at a time, following the profile """
+        offset = (at - self.started) % self.cycle
+        for seconds, multiplier in self.profile:
+            if offset < seconds:
+                return self.rate * multiplier
+            offset -= seconds
+        return self.rate
+
+    def get_scheduled(self, at: float) -> float:
         """
-        generate a small CDR data set for mobile phone movement within an
-        approximate specified radius of miles. this data simulates mobile
-        phone location by connection to cell towers or GPS data. results
-        can be plotted on a map.  locations can be constrained to be within
-        a geographic boundary for a provided GeoJSON file. if a location
-        is outside of the boundary we recalculate it
+        the number of records due from the start to a time, following the
+        profile, so the target over an interval is the difference at its
+        ends divided by its length
 
         """
-        orig_x = x0
-        orig_y = y0
-
-        meters = int(miles) * 1610
-        if (geojson):
-            boundary_coords = geo.extract_geojson_coordinates(geojson)
-
-        phone_to_track = get_random_phone_number()
-        network = random.choice(data.operators)
-        for i in range(int(records)):
-            x0, y0 = geo.get_random_location(
-                float(x0), float(y0), meters)
-            if (geojson):
-                while not geo.is_within_boundary(
-                        float(x0), float(y0), boundary_coords):
-                    x0, y0 = geo.get_random_location(
-                        orig_x, orig_y, meters)
-
-            random_date = get_random_date(
-                datetime.now() - timedelta(30),
-                datetime.now() +
-                timedelta(days=30))
-
-            print(
-                '"M",' +
-                '"' + str(phone_to_track) + '",' +
-                '"' + str(get_random_phone_number()) + '",' +
-                '"' + random_date.strftime("%d/%m/%Y") + '",' +
-                '"' + random_date.strftime("%H:%M:%S") + '",' +
-                '"' + str(random.randrange(1, 600)) + '",' +
-                '"GBR",' +
-                '"' + str(network) + '",' +
-                '"' + str(random.randrange(1, 10)) + '",' +
-                '"' + str(uuid.uuid4()) + '",' +
-                '"' + str(i) + '",' +
-                '"' + str(x0) + '",' +
-                '"' + str(y0) + '"'
-            )
-
-    def get_random_cdr_data(records, x0, y0, geojson):
+        cycles, offset = divmod(max(at - self.started, 0.0), self.cycle)
+        records = cycles * sum(seconds * multiplier
+                               for seconds, multiplier in self.profile)
+        for seconds, multiplier in self.profile:
+            records += min(max(offset, 0.0), seconds) * multiplier
+            offset -= seconds
+        return records * self.rate
+
+    def acquire(self, records: int) -> float:
         """
-        generate random CDR records. locations can be constrained to be within
-        a geographic boundary for a provided GeoJSON file. if a location
-        is outside of the boundary we recalculate it
+        wait until records can be sent and return the lag, the seconds
+        emission is behind the schedule
 
         """
+        rate = self.get_rate(self.due)
+        while rate <= 0:
+            self.due += 0.01
+            rate = self.get_rate(self.due)
+        now = time.perf_counter()
+        if self.due > now:
+            time.sleep(self.due - now)
+            now = time.perf_counter()
+        lag = max(now - self.due, 0.0)
+        self.due = max(self.due, now - self.capacity / rate) + \
+            records / rate
+        return lag
+
+
+def parse_rate_profile(profile: str) -> list:
+    """
+    convert a burst profile such as 10:1,2:5,5:0.5 into a list of
+    (seconds, rate multiplier) steps that repeat for the length of a run.
+    steps can not be negative and at least one multiplier must be greater
+    than 0, otherwise no record would ever be due
+
+    """
+    steps = []
+    for step in str(profile).split(','):
+        if step.count(':') != 1:
+            raise ValueError('burst profile steps must be seconds:multiplier')
+        seconds, multiplier = step.split(':')
+        steps.append((float(seconds), float(multiplier)))
+    if any(seconds < 0 or multiplier < 0 for seconds, multiplier in steps):
+        raise ValueError('burst profile steps can not be negative')
+    if sum(seconds for seconds, multiplier in steps) <= 0:
+        raise ValueError('burst profile must last longer than 0 seconds')
+    if not any(seconds > 0 and multiplier > 0
+               for seconds, multiplier in steps):
+        raise ValueError('burst profile must have a multiplier greater '
+                         'than 0')
+    return steps
+
+
+def write_cdrs_at_rate(count: int, rate: float, output, profile=None,
+                       report_interval=5, output_format='csv', **options):
+    """
+    write count random CDR records, or records until interrupted when count
+    is 0, at a steady rate per second with call timestamps of the time each
+    record is sent. records are sent in chunks of about 10 milliseconds of
+    output so high rates can be held, and every report_interval seconds the
+    achieved rate and target rate over the interval, lag behind the
+    schedule and percentiles of the time to generate a chunk are reported
+    on stderr. the bucket holds about 10 milliseconds of records at the
+    peak rate of the profile, so bursts can reach their target. the options
+    are those of generate_cdrs
+
+    """
+    rate = float(rate)
+    chunk = int(min(max(rate / 100, 1), BATCH_SIZE))
+    peak = rate * max([multiplier for seconds, multiplier in profile or
+                       [(1, 1.0)]])
+    limiter = RateLimiter(rate, int(min(max(peak / 100, chunk), BATCH_SIZE)),
+                          profile)
+    records = int(count) or 2 ** 62
+
+    sent = 0
+    reported = sent
+    reported_at = time.perf_counter()
+    report_at = reported_at + float(report_interval)
+    lags = []
+    latencies = []
+    batches = generate_cdrs(records, batch_size=chunk, **options)
+    try:
+        while True:
+            started = time.perf_counter()
+            batch = next(batches, None)
+            if batch is None:
+                break
+            size = len(batch['cell_id'])
+            latency = time.perf_counter() - started
+            lag = limiter.acquire(size)
+            started = time.perf_counter()
+            batch['timestamp'] = np.full(
+                size, np.datetime64(datetime.now(), 's'))
+            formatted = format_batch(batch, output_format)
+            latencies.append(latency + time.perf_counter() - started)
+            output.write(formatted, size)
+            output.flush()
+            lags.append(lag)
+            sent += size
+
+            now = time.perf_counter()
+            if now >= report_at:
+                interval = now - reported_at
+                print(format_rate_report(
+                    (sent - reported) / interval,
+                    (limiter.get_scheduled(now) -
+                     limiter.get_scheduled(reported_at)) / interval,
+                    lags, latencies),
+                    file=sys.stderr)
+                reported = sent
+                reported_at = now
+                report_at = now + float(report_interval)
+                lags = []
+                latencies = []
+    except (KeyboardInterrupt):
+        pass
+    return sent
+
+
+def format_rate_report(achieved: float, target: float, lags: list,
+                       latencies: list) -> str:
+    """ summarise the achieved rate, lag and generation latency """
+    if not latencies:
+        return 'no records sent'
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return ('rate ' + '%.0f' % achieved + '/s target ' + '%.0f' % target +
+            '/s lag ' + '%.3f' % max(lags) + 's generation p50 ' +
+            '%.2f' % p50 + 'ms p95 ' + '%.2f' % p95 + 'ms p99 ' +
+            '%.2f' % p99 + 'ms')
+
+
+def format_sampling_report(stats: dict) -> str:
+    """ summarise the points drawn within a boundary by its sampler """
+    return ('boundary sampling ' + str(stats['accepted']) + ' points from ' +
+            str(stats['triangles']) + ' triangles, rejection rate ' +
+            '%.1f' % (stats['rejection_rate'] * 100) + '%, ' +
+            '%.2f' % stats['microseconds_per_point'] + 'us per point')
+
+
+def check_imei_numbers(file_name):
+    """
+    validate the IMEI field of every record in a CDR file with the Luhn
+    algorithm. records are checked BATCH_SIZE at a time and each
+    invalid record is reported
+
+    """
+    try:
+        f = open(file_name, 'r', newline='')
+    except (FileNotFoundError):
+        raise SystemExit('File ' + file_name + ' not found.')
+    reader = csv.reader(f)
+    header = next(reader, [])
+    if 'IMEI' not in header:
+        raise SystemExit('File ' + file_name + ' has no IMEI field.')
+    field = header.index('IMEI')
+
+    checked = 0
+    invalid = 0
+    while True:
+        rows = list(itertools.islice(reader, BATCH_SIZE))
+        if not rows:
+            break
+        numbers = [row[field] if len(row) > field else ''
+                   for row in rows]
+        for i in np.flatnonzero(~is_valid_luhn(numbers)).tolist():
+            print('Row ' + str(checked + i + 2) +
+                  ' invalid IMEI ' + numbers[i])
+            invalid += 1
+        checked += len(rows)
+    f.close()
+    print(str(checked) + ' records checked, ' + str(invalid) +
+          ' invalid IMEI numbers')
+    if invalid:
+        sys.exit(-1)
+
+
+def main():
+
+    if (args.check_imei):
+        check_imei_numbers(args.check_imei)
+        return
 
-        orig_x = x0
-        orig_y = y0
-        if (geojson):
-            boundary_coords = geo.extract_geojson_coordinates(geojson)
-
-        for i in range(int(records)):
-            x0, y0 = geo.get_random_location(
-                float(x0), float(y0), 8000)
-            if (geojson):
-                while not geo.is_within_boundary(
-                        float(x0), float(y0), boundary_coords):
-                    x0, y0 = geo.get_random_location(
-                        orig_x, orig_y, 8000)
-
-            random_date = get_random_date(
-                datetime.now() - timedelta(30),
-                datetime.now() +
-                timedelta(days=30))
-            print(
-                '"M",' +
-                '"' + str(get_random_phone_number()) + '",' +
-                '"' + str(get_random_phone_number()) + '",' +
-                '"' + random_date.strftime("%d/%m/%Y") + '",' +
-                '"' + random_date.strftime("%H:%M:%S") + '",' +
-                '"' + str(random.randrange(1, 600)) + '",' +
-                '"GBR",' +
-                '"' + str(random.choice(data.operators)) + '",' +
-                '"' + str(random.randrange(1, 10)) + '",' +
-                '"' + str(uuid.uuid4()) + '",' +
-                '"' + str(i) + '",' +
-                '"' + str(x0) + '",' +
-                '"' + str(y0) + '"'
-            )
-
-    def print_header():
-        print(
-            '"Call Type",' +
-            '"Customer Identifier",' +
-            '"Telephone Number Dialed",' +
-            '"Call Date",' +
-            '"Call Time",' +
-            '"Duration",' +
-            '"Country of Origin",' +
-            '"Network",' +
-            '"Ring Time",' +
-            '"RecordID",' +
-            '"Cell ID",' +
-            '"Cell Lat",' +
-            '"Cell Long"')
+    if (args.shard_files and (args.o or args.t or args.rate)):
+        raise SystemExit('--shard-files writes every record to its own shard '
+                         'file, it cannot be used with -o, -t or --rate.')
+
+    profile = None
+    if (args.rate):
+        try:
+            if float(args.rate) <= 0:
+                raise SystemExit('--rate must be greater than 0.')
+            if (args.burst):
+                profile = parse_rate_profile(args.burst)
+        except ValueError as e:
+            raise SystemExit('Incorrect --rate or --burst, ' + str(e) + '.')
+
+    if (args.seed):
+        seed = int(args.seed)
+    else:
+        seed = np.random.SeedSequence().entropy
+        print('seed ' + str(seed), file=sys.stderr)
+    random.seed(seed)
+    np.random.seed(seed % 2 ** 32)
+
+    if (args.date):
+        window = get_call_window(
+            datetime.strptime(args.date, '%Y-%m-%d'), args.days)
+    else:
+        window = get_call_window(days=args.days)
+
+    if (args.geohash and args.format == 'binary'):
+        raise SystemExit('Binary records have no Geohash field, use '
+                         '--format csv with --geohash.')
+    if (args.geohash):
+        try:
+            geohash.check_precision(args.geohash)
+        except ValueError as e:
+            raise SystemExit('error: ' + str(e) + '.')
+
+    boundary = None
+    if (args.b):
+        boundary = geo.load_boundary(
+            args.b, meters=int(args.boundary_tolerance or 0),
+            conservative=args.boundary_outer)
+        if boundary.simplification:
+            print(geo.format_simplification_report(boundary.simplification),
+                  file=sys.stderr)
 
     if (args.c):
         x0, y0, *remaining = str(args.c).split(',')
 
         ''' ensure the specified coordinate are within the specified boundary '''
         if (args.b):
-            boundary_coords = geo.extract_geojson_coordinates(args.b)
             print(str(x0) + ',' + str(y0))
             if not geo.is_within_boundary(
                     float(x0),
                     float(y0),
-                    boundary_coords):
+                    boundary):
                 print(
                     'Specified coordinate must be within boundary of ' + str(args.b))
                 sys.exit(-1)
     else:
-        x0, y0 = geo.get_random_location(
-            data.places['London']['lat'],
-            data.places['London']['lng'],
-            8000)
+        x0, y0 = get_default_origin(seed)
+
+    # the timestamp of uuid7 RecordIDs, the same for every worker
+    created = datetime.now()
 
     try:
-        print_header()
+        if (args.shard_files):
+            # every shard file has its own header, so nothing is written to
+            # stdout
+            write_cdr_shards(args.start, args.n, x0, y0, boundary,
+                             args.workers, seed, window, args.record_ids,
+                             args.imei, args.geohash, args.format,
+                             args.shard_files, None, created)
+            return
+        header, record_size = get_output_header(args.format, args.imei,
+                                                bool(args.geohash))
+        output = CDRWriter(args.o, args.rotate_records, args.rotate_size,
+                           header, record_size)
         if (args.t):
-            get_random_location_tracking(
-                x0, y0, args.m, args.t, args.b)
+            for record in get_random_location_tracking(
+                    x0, y0, args.m, args.t, boundary, window, args.imei,
+                    args.geohash, args.record_ids, created,
+                    int(args.start) - int(args.t)):
+                output.write(format_record(record, args.format, args.imei),
+                             1)
 
-        get_random_cdr_data(args.n, x0, y0, args.b)
+        if (args.rate):
+            write_cdrs_at_rate(
+                args.n, args.rate, output,
+                profile,
+                args.report_interval, args.format, origin=(x0, y0),
+                boundary=boundary,
+                seed=seed, start=args.start, window=window,
+                record_ids=args.record_ids, imei=args.imei,
+                geohash_precision=args.geohash, created=created)
+        elif (args.workers):
+            write_cdr_shards(args.start, args.n, x0, y0, boundary,
+                             args.workers, seed, window, args.record_ids,
+                             args.imei, args.geohash, args.format,
+                             None, output, created)
+        else:
+            for batch in generate_cdrs(
+                    args.n, (x0, y0), 8000, boundary, seed, args.start,
+                    BATCH_SIZE, window, args.record_ids, args.imei,
+                    args.geohash, created):
+                output.write(format_batch(batch, args.format),
+                             len(batch['cell_id']))
+        output.close()
+        if (args.o):
+            print(output.report(), file=sys.stderr)
+            if boundary and boundary.sampler and boundary.sampler.accepted:
+                print(format_sampling_report(boundary.sampler.get_stats()),
+                      file=sys.stderr)
     except (ValueError):
         raise SystemExit(
             'Incorrect usage. Check command line options.')
@@ -203,9 +1164,16 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         '-n',
-        required=True,
+        '--count',
+        dest='n',
+        required=False,
         metavar='INT',
         help='number of records to create')
+    parser.add_argument(
+        '--start',
+        default=0,
+        metavar='INT',
+        help='number of the first record to create, used with --seed')
     parser.add_argument(
         '-t',
         metavar='INT',
@@ -224,6 +1192,101 @@ if __name__ == '__main__':
         required=False,
         metavar='STR',
         help='GeoJSON boundary/polygon for coordinate')
+    parser.add_argument(
+        '--boundary-tolerance',
+        required=False,
+        metavar='METERS',
+        help='simplify the boundary to within this many meters')
+    parser.add_argument(
+        '--boundary-outer',
+        action='store_true',
+        help='simplify the boundary conservatively so it only grows')
+    parser.add_argument(
+        '--workers',
+        required=False,
+        metavar='INT',
+        help='number of processes used to generate records')
+    parser.add_argument(
+        '--seed',
+        required=False,
+        metavar='INT',
+        help='seed for reproducible generation')
+    parser.add_argument(
+        '--date',
+        required=False,
+        metavar='YYYY-MM-DD',
+        help='centre of the call date window, default today')
+    parser.add_argument(
+        '--days',
+        default=60,
+        metavar='INT',
+        help='number of days in the call date window, default 60')
+    parser.add_argument(
+        '--record-ids',
+        default='uuid4',
+        choices=['uuid4', 'uuid7'],
+        help='random (uuid4) or time ordered (uuid7) RecordIDs')
+    parser.add_argument(
+        '--imei',
+        action='store_true',
+        help='add an IMEI field after the RecordID')
+    parser.add_argument(
+        '--geohash',
+        required=False,
+        metavar='INT',
+        help='add a Geohash field of this precision after the Cell Long')
+    parser.add_argument(
+        '--check-imei',
+        required=False,
+        metavar='FILE',
+        help='validate the IMEI field of a CDR file and exit')
+    parser.add_argument(
+        '--shard-files',
+        required=False,
+        metavar='STR',
+        help='write each shard to its own file, e.g. cdr-{:04}.csv')
+    parser.add_argument(
+        '-o',
+        '--output',
+        dest='o',
+        required=False,
+        metavar='FILE',
+        help='output file, compressed if it ends in .gz, .bz2 or .xz')
+    parser.add_argument(
+        '--format',
+        default='csv',
+        choices=['csv', 'binary'],
+        help='quoted CSV or fixed-width binary records, see cdrbin.py')
+    parser.add_argument(
+        '--rotate-records',
+        required=False,
+        metavar='INT',
+        help='start a new output file after this many records')
+    parser.add_argument(
+        '--rotate-size',
+        required=False,
+        metavar='SIZE',
+        help='start a new output file before it exceeds this size, counted '
+             'before compression, e.g. 512M')
+    parser.add_argument(
+        '--rate',
+        required=False,
+        metavar='FLOAT',
+        help='send records in real time at this many records per second, '
+             'with -n 0 to run until interrupted')
+    parser.add_argument(
+        '--burst',
+        required=False,
+        metavar='PROFILE',
+        help='repeating rate profile of seconds:multiplier steps, '
+             'e.g. 10:1,2:5')
+    parser.add_argument(
+        '--report-interval',
+        default=5,
+        metavar='FLOAT',
+        help='seconds between rate reports, default 5')
     args = parser.parse_args()
+    if not (args.n or args.check_imei):
+        parser.error('the following arguments are required: -n/--count')
 
     main()
@@ -5,11 +5,20 @@
 # -----------------------------------------------------------
 import random
 import json
-import itertools as it
-from math import acos
+import time
+import heapq
+import functools
+from math import acos, sin, cos, radians
 
 import numpy as np
 
+# mean radius of the earth in miles used for distances
+RADIUS_MILES = 3958.756
+METERS_PER_MILE = 1609.344
+
+# the number of distances calculated together by get_distance_matrix
+MATRIX_BLOCK_SIZE = 1048576
+
 
 def get_random_location(x0: float, y0: float, meters: int):
     """
@@ -37,6 +46,118 @@ def get_random_location(x0: float, y0: float, meters: int):
     return (float('%.6f' % (x0 + x1)), float('%.6f' % (y0 + y)))
 
 
+def get_random_offsets(y0, meters, size, rng):
+    """
+    the random latitude and longitude offsets in degrees of locations
+    within an approximate number of meters, shrunk east-west for y0 as
+    get_random_location does
+
+    """
+    # approximate equivalent of meters to a degree is 111139
+    r = np.asarray(meters) / 111139
+    u = rng.random(size)
+    v = rng.random(size)
+    w = r * np.sqrt(u)
+    t = 2 * np.pi * v
+    return (w * np.cos(t) / np.cos(np.asarray(y0) * (np.pi / 180)),
+            w * np.sin(t))
+
+
+def get_random_locations(x0, y0, meters, size=None, rng=None):
+    """
+    array version of get_random_location. generate random locations within
+    an approximate number of meters from decimal degree coordinates and
+    return them as two numpy arrays of latitudes and longitudes rounded to
+    6 decimal places. the coordinates and meters may be arrays, giving an
+    origin and radius for each location, and size locations are generated
+    around a single origin. size defaults to one location per origin
+
+    """
+    x0 = np.asarray(x0, dtype=float)
+    y0 = np.asarray(y0, dtype=float)
+    valid = is_valid_coordinates(x0, y0)
+    if not np.all(valid):
+        i = np.argmin(valid.ravel()) if valid.ndim else 0
+        raise ValueError('invalid WGS 84 coordinate ' +
+                         str(np.broadcast_to(x0, valid.shape).ravel()[i]) +
+                         ', ' +
+                         str(np.broadcast_to(y0, valid.shape).ravel()[i]))
+    if rng is None:
+        rng = np.random.default_rng()
+    if size is None:
+        size = np.broadcast(x0, y0, meters).shape
+    x, y = get_random_offsets(y0, meters, size, rng)
+    return (np.round(x0 + x, 6), np.round(y0 + y, 6))
+
+
+def clamp_track(values, lo: float, hi: float):
+    """
+    hold the cumulative positions of a track within lo and hi as if every
+    step that crosses a limit stops at it, so later steps continue from
+    the limit. each pass stops the track at one limit and then the other
+    until neither is crossed
+
+    """
+    while True:
+        below = np.maximum.accumulate(np.maximum(lo - values, 0))
+        values = values + below
+        above = np.maximum.accumulate(np.maximum(values - hi, 0))
+        values = values - above
+        if below[-1] < 1e-9 and above[-1] < 1e-9:
+            return np.clip(values, lo, hi)
+
+
+def get_random_walk(x0: float, y0: float, meters, steps: int, rng=None,
+                    boundary=None):
+    """
+    generate a track of steps locations, each a random location within an
+    approximate number of meters of the one before, as
+    gencdr.get_random_location_tracking moves a phone. the displacements
+    are drawn together and summed, meters may be an array with a radius
+    for each step, and latitudes stop at the poles while longitudes wrap
+    at the antimeridian. with a prepared boundary, a step that leaves it
+    is drawn again within both the boundary and meters of the location
+    before it, moving the rest of the track with it. returns two numpy
+    arrays of latitudes and longitudes rounded to 6 decimal places
+
+    """
+    x0, y0 = float(x0), float(y0)
+    if not is_valid_coordinate(x0, y0):
+        raise ValueError('invalid WGS 84 coordinate ' +
+                         str(x0) + ', ' + str(y0))
+    if rng is None:
+        rng = np.random.default_rng()
+    x, y = get_random_offsets(y0, np.broadcast_to(meters, steps), steps, rng)
+    lats = clamp_track(x0 + np.cumsum(x), -90, 90)
+    lngs = (y0 + np.cumsum(y) + 180) % 360 - 180
+    if boundary is not None:
+        sampler = boundary.get_sampler()
+        radius = np.broadcast_to(meters, steps)
+        first = 0
+        while first < steps:
+            inside = boundary.contains_points(lats[first:], lngs[first:])
+            if inside.all():
+                break
+            i = first + int(np.argmin(inside))
+            lat, lng = (x0, y0) if i == 0 else (lats[i - 1], lngs[i - 1])
+            lat, lng = sampler.sample(1, rng, lat, lng, int(radius[i]))
+            lats[i:] += lat[0] - lats[i]
+            lngs[i:] += lng[0] - lngs[i]
+            first = i + 1
+    return (np.round(lats, 6), np.round(lngs, 6))
+
+
+def is_valid_coordinates(x0, y0):
+    """
+    array version of is_valid_coordinate. returns a boolean mask of the
+    valid latitude and longitude pairs
+
+    """
+    x0 = np.asarray(x0)
+    y0 = np.asarray(y0)
+    return (-90 <= x0) & (x0 <= 90) & (-180 <= y0) & (y0 <= 180)
+
+
 def is_valid_coordinate(x0: float, y0: float) -> bool:
     """
     validates a latitude and longitude decimal degree coordinate pairs.
@@ -57,66 +178,791 @@ def get_distance(x0: float, y0: float, x1: float, y1: float) -> int:
 
     """
     result = -1
-    radius_miles = 3958.756
     if is_valid_coordinate(x0, y0) and is_valid_coordinate(x1, y1):
-        y0, x0, y1, x1 = map(np.radians, [y0, x0, y1, x1])
+        y0, x0, y1, x1 = map(radians, [y0, x0, y1, x1])
         result = float(
             '%.1f' %
-            (radius_miles *
-             acos(
-                 np.sin(x0) *
-                 np.sin(x1) +
-                 np.cos(x0) *
-                 np.cos(x1) *
-                 np.cos(
-                     y0 -
-                     y1))))
+            (RADIUS_MILES *
+             acos(max(-1.0, min(1.0,
+                               sin(x0) *
+                               sin(x1) +
+                               cos(x0) *
+                               cos(x1) *
+                               cos(
+                                   y0 -
+                                   y1))))))
     return result
 
 
-def is_within_boundary(lat: float, lng: float, poly: list) -> bool:
+def get_distances(x0, y0, x1, y1, dtype=np.float64):
+    """
+    array version of get_distance. calculate the distances in miles between
+    aligned arrays of latitudes and longitudes, or between an array and a
+    single coordinate. the haversine form is used as it stays accurate for
+    points close together, and distances are not rounded. pairs with an
+    invalid WGS 84 coordinate are nan. dtype can be np.float32 to halve the
+    memory of large arrays at about 7 significant digits
+
+    """
+    x0, y0, x1, y1 = (np.asarray(v, dtype=dtype) for v in (x0, y0, x1, y1))
+    a = np.sin(np.radians(x1 - x0) / 2) ** 2 + \
+        np.cos(np.radians(x0)) * np.cos(np.radians(x1)) * \
+        np.sin(np.radians(y1 - y0) / 2) ** 2
+    distances = (2 * RADIUS_MILES) * np.arcsin(np.sqrt(np.minimum(a, 1)))
+    invalid = ~(is_valid_coordinates(x0, y0) & is_valid_coordinates(x1, y1))
+    if invalid.any():
+        distances = np.where(invalid, np.nan, distances)
+    return distances.astype(dtype, copy=False)
+
+
+def get_track_distances(lats, lngs, dtype=np.float64):
+    """
+    the distances in miles between consecutive points of a track, one less
+    than the number of points
+
+    """
+    lats = np.asarray(lats, dtype=dtype)
+    lngs = np.asarray(lngs, dtype=dtype)
+    return get_distances(lats[:-1], lngs[:-1], lats[1:], lngs[1:], dtype)
+
+
+def get_distance_matrix(x0, y0, x1, y1, dtype=np.float64, out=None,
+                        block_size=MATRIX_BLOCK_SIZE):
+    """
+    the N x M matrix of distances in miles from N points to M points. the
+    matrix is calculated in blocks of rows of at most block_size distances
+    so the working arrays stay the size of a block whatever the size of the
+    matrix. out can be an array to fill, such as a np.memmap for a matrix
+    too large for memory
+
+    """
+    x0, y0, x1, y1 = (np.asarray(v, dtype=dtype).ravel()
+                      for v in (x0, y0, x1, y1))
+    if out is None:
+        out = np.empty((len(x0), len(x1)), dtype=dtype)
+    lat0, lng0 = np.radians(x0), np.radians(y0)
+    lat1, lng1 = np.radians(x1), np.radians(y1)
+    cos0, cos1 = np.cos(lat0), np.cos(lat1)
+    valid0 = is_valid_coordinates(x0, y0)
+    valid1 = is_valid_coordinates(x1, y1)
+    all_valid = valid0.all() and valid1.all()
+    rows = max(1, block_size // max(1, len(x1)))
+    for first in range(0, len(x0), rows):
+        last = min(first + rows, len(x0))
+        a = np.sin((lat1 - lat0[first:last, None]) / 2) ** 2
+        a += cos0[first:last, None] * cos1 * \
+            np.sin((lng1 - lng0[first:last, None]) / 2) ** 2
+        block = np.arcsin(np.sqrt(np.minimum(a, 1), out=a), out=a)
+        block *= 2 * RADIUS_MILES
+        if not all_valid:
+            block[~(valid0[first:last, None] & valid1)] = np.nan
+        out[first:last] = block
+    return out
+
+
+# the number of point and edge pairs tested together by
+# Ring.contains_points
+CHUNK_SIZE = 32768
+
+
+class Ring:
+    """
+    a closed ring of a polygon prepared once for repeated point in polygon
+    tests. the ring is a list of "lat,lng" coordinate strings or an array
+    of latitude, longitude rows, and is completed by joining its last
+    coordinate to its first. the edges are held in contiguous float arrays
+    indexed by longitude slab. a point is tested by casting a ray north
+    along its longitude, as is_within_boundary always has, so only the
+    edges in the point's slab, the few that can cross that line, are
+    examined, and the point is inside when the ray crosses an odd number
+    of edges. points outside the bounding box of the ring are rejected
+    before any edge is tested. an index returned by get_index, such as one
+    read from a geocache file, can be given so the ring is not indexed
+    again
+
+    """
+
+    def __init__(self, coords, slab_edges=8, index=None):
+        if not isinstance(coords, np.ndarray):
+            coords = np.array([str(c).split(',') for c in coords],
+                              dtype=float)
+        self.coords = coords
+        x0, y0 = coords[:, 0], coords[:, 1]
+        self.min_lat, self.max_lat = float(x0.min()), float(x0.max())
+        self.min_lng, self.max_lng = float(y0.min()), float(y0.max())
+        if index is not None:
+            (self.offsets, self.x0, self.y0, self.x1, self.y1,
+             self.slab_width) = index
+            self.slabs = len(self.offsets) - 1
+            return
+        x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+
+        # every edge is listed in each slab its longitude range overlaps
+        self.slabs = max(1, len(x0) // slab_edges)
+        self.slab_width = (self.max_lng - self.min_lng) / self.slabs or 1.0
+        first = self.get_slab(np.minimum(y0, y1))
+        last = self.get_slab(np.maximum(y0, y1))
+        counts = last - first + 1
+        edges = np.repeat(np.arange(len(x0)), counts)
+        slab = np.repeat(first - np.cumsum(counts) + counts, counts) + \
+            np.arange(len(edges))
+        order = np.argsort(slab, kind='stable')
+        edges = edges[order]
+        self.offsets = np.searchsorted(slab[order],
+                                       np.arange(self.slabs + 1))
+        self.x0 = np.ascontiguousarray(x0[edges])
+        self.y0 = np.ascontiguousarray(y0[edges])
+        self.x1 = np.ascontiguousarray(x1[edges])
+        self.y1 = np.ascontiguousarray(y1[edges])
+
+    def get_index(self) -> tuple:
+        """ the longitude slab index of the ring's edges """
+        return (self.offsets, self.x0, self.y0, self.x1, self.y1,
+                self.slab_width)
+
+    def get_slab(self, lng):
+        """ the index of the longitude slab of a longitude or array """
+        slab = np.floor((lng - self.min_lng) / self.slab_width).astype(int)
+        return np.clip(slab, 0, self.slabs - 1)
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """ determines if a point is within the ring """
+        if not (self.min_lat <= lat <= self.max_lat and
+                self.min_lng <= lng <= self.max_lng):
+            return False
+        slab = int(self.get_slab(lng))
+        start, end = self.offsets[slab], self.offsets[slab + 1]
+        x0, y0 = self.x0[start:end], self.y0[start:end]
+        x1, y1 = self.x1[start:end], self.y1[start:end]
+        crosses = (np.minimum(y0, y1) < lng) & (lng <= np.maximum(y0, y1))
+        if not crosses.any():
+            return False
+        x0, y0, x1, y1 = x0[crosses], y0[crosses], x1[crosses], y1[crosses]
+        xinters = x0 + (lng - y0) * (x1 - x0) / (y1 - y0)
+        return bool(np.count_nonzero(lat <= xinters) % 2)
+
+    def contains_points(self, lats, lngs, chunk_size=CHUNK_SIZE):
+        """
+        array version of contains. returns a boolean mask of the points
+        within the ring. points are grouped by longitude slab and each
+        group is tested against the edges of its slab at once, in blocks
+        of at most chunk_size point and edge pairs so that the working
+        arrays stay in cache
+
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        mask = np.zeros(lats.shape, dtype=bool)
+        candidates = np.flatnonzero(
+            (self.min_lat <= lats) & (lats <= self.max_lat) &
+            (self.min_lng <= lngs) & (lngs <= self.max_lng))
+        if not len(candidates):
+            return mask
+        slabs = self.get_slab(lngs[candidates])
+        order = np.argsort(slabs, kind='stable')
+        candidates, slabs = candidates[order], slabs[order]
+        groups = np.flatnonzero(np.diff(slabs)) + 1
+        for points, slab in zip(np.split(candidates, groups),
+                                slabs[np.r_[0, groups]]):
+            start, end = self.offsets[slab], self.offsets[slab + 1]
+            if start == end:
+                continue
+            x0, y0 = self.x0[start:end], self.y0[start:end]
+            x1, y1 = self.x1[start:end], self.y1[start:end]
+            low, high = np.minimum(y0, y1), np.maximum(y0, y1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                slope = (x1 - x0) / (y1 - y0)
+            step = max(1, chunk_size // (end - start))
+            for first in range(0, len(points), step):
+                block = points[first:first + step]
+                lat = lats[block, None]
+                lng = lngs[block, None]
+                crosses = (low < lng) & (lng <= high)
+                with np.errstate(invalid='ignore'):
+                    above = lat <= x0 + (lng - y0) * slope
+                mask[block] = np.count_nonzero(crosses & above, axis=1) % 2
+        return mask
+
+
+class Polygon:
+    """
+    a polygon of an outer ring and any holes, each a Ring. a point is
+    within the polygon when it is within the outer ring and none of the
+    holes. the bounding box of the polygon is that of its outer ring, and
+    a hole is only tested for points within its own bounding box
+
+    """
+
+    def __init__(self, rings: list):
+        rings = [r if isinstance(r, Ring) else Ring(r) for r in rings]
+        self.outer = rings[0]
+        self.holes = rings[1:]
+        self.min_lat, self.max_lat = self.outer.min_lat, self.outer.max_lat
+        self.min_lng, self.max_lng = self.outer.min_lng, self.outer.max_lng
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """ determines if a point is within the polygon """
+        return self.outer.contains(lat, lng) and \
+            not any(hole.contains(lat, lng) for hole in self.holes)
+
+    def contains_points(self, lats, lngs):
+        """ array version of contains """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        mask = self.outer.contains_points(lats, lngs)
+        for hole in self.holes:
+            inside = np.flatnonzero(mask)
+            mask[inside] &= ~hole.contains_points(lats[inside], lngs[inside])
+        return mask
+
+
+class Boundary:
+    """
+    a 2D boundary of one or more polygons, such as a country and its
+    islands, prepared once for repeated point in polygon tests. polygons
+    are given as Polygons or as lists of rings, the outer ring first and
+    then any holes. a point is within the boundary when it is within any
+    polygon, and only the polygons whose bounding box holds the point are
+    tested. the triangles of the outer rings can be given, when read from
+    a geocache file, so that the sampler does not triangulate them again
+
+    """
+
+    def __init__(self, polygons: list, triangles=None):
+        self.polygons = [p if isinstance(p, Polygon) else Polygon(p)
+                         for p in polygons]
+        self.triangles = triangles
+        self.sampler = None
+        self.simplification = None
+        self.bboxes = np.array([[p.min_lat, p.max_lat, p.min_lng, p.max_lng]
+                                for p in self.polygons])
+        self.min_lat = float(self.bboxes[:, 0].min())
+        self.max_lat = float(self.bboxes[:, 1].max())
+        self.min_lng = float(self.bboxes[:, 2].min())
+        self.max_lng = float(self.bboxes[:, 3].max())
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """ determines if a point is within the boundary """
+        if not (self.min_lat <= lat <= self.max_lat and
+                self.min_lng <= lng <= self.max_lng):
+            return False
+        b = self.bboxes
+        for i in np.flatnonzero((b[:, 0] <= lat) & (lat <= b[:, 1]) &
+                                (b[:, 2] <= lng) & (lng <= b[:, 3])):
+            if self.polygons[i].contains(lat, lng):
+                return True
+        return False
+
+    def contains_points(self, lats, lngs):
+        """
+        array version of contains. returns a boolean mask of the points
+        within the boundary. the points are sorted by longitude once so
+        that the points within each polygon's bounding box are found by
+        binary search
+
+        """
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        mask = np.zeros(lats.shape, dtype=bool)
+        order = np.argsort(lngs, kind='stable')
+        sorted_lngs = lngs[order]
+        for polygon in self.polygons:
+            points = order[np.searchsorted(sorted_lngs, polygon.min_lng):
+                           np.searchsorted(sorted_lngs, polygon.max_lng,
+                                           side='right')]
+            points = points[~mask[points] &
+                            (polygon.min_lat <= lats[points]) &
+                            (lats[points] <= polygon.max_lat)]
+            if len(points):
+                mask[points] = polygon.contains_points(lats[points],
+                                                       lngs[points])
+        return mask
+
+    def get_sampler(self):
+        """
+        the BoundarySampler of the boundary, created the first time it is
+        needed so the boundary is only triangulated once
+
+        """
+        if self.sampler is None:
+            self.sampler = BoundarySampler(self)
+        return self.sampler
+
+
+def triangulate_ring(ring) -> np.ndarray:
+    """
+    split a ring of latitude, longitude rows into triangles by ear
+    clipping. returns an array of triangles of three latitude, longitude
+    rows. a vertex is an ear when it turns left and no reflex vertex lies
+    in the triangle it makes with its neighbours. if a ring is too
+    degenerate for any ear to be found, the current vertex is clipped so
+    that triangulation always completes
+
+    """
+    ring = ring[np.any(ring != np.roll(ring, 1, axis=0), axis=1)]
+    n = len(ring)
+    if n < 3:
+        return np.zeros((0, 3, 2))
+    # turn in the plane of longitude x and latitude y, counter clockwise
+    x, y = ring[:, 1], ring[:, 0]
+    if np.dot(x, np.roll(y, -1)) < np.dot(np.roll(x, -1), y):
+        ring = ring[::-1]
+        x, y = ring[:, 1], ring[:, 0]
+    prev = [n - 1] + list(range(n - 1))
+    next = list(range(1, n)) + [0]
+
+    def turn(a, b, c):
+        return (x[b] - x[a]) * (y[c] - y[a]) - (y[b] - y[a]) * (x[c] - x[a])
+
+    reflex = turn(np.array(prev), np.arange(n), np.array(next)) < 0
+    triangles = []
+    i = 0
+    remaining = n
+    attempts = 0
+    while remaining > 3:
+        a, c = prev[i], next[i]
+        t = turn(a, i, c)
+        ear = t == 0 or attempts > remaining
+        if t > 0 and not ear:
+            p = np.flatnonzero(reflex)
+            p = p[(x[p] != x[a]) | (y[p] != y[a])]
+            p = p[(x[p] != x[c]) | (y[p] != y[c])]
+            ear = not np.any((turn(a, i, p) >= 0) & (turn(i, c, p) >= 0) &
+                             (turn(c, a, p) >= 0))
+        if not ear:
+            i = c
+            attempts += 1
+            continue
+        if t != 0:
+            triangles.append((a, i, c))
+        next[a], prev[c] = c, a
+        reflex[i] = False
+        reflex[a] = turn(prev[a], a, c) < 0
+        reflex[c] = turn(a, c, next[c]) < 0
+        remaining -= 1
+        attempts = 0
+        i = a
+    triangles.append((prev[i], i, next[i]))
+    return ring[np.array(triangles)]
+
+
+def get_alias_table(weights):
+    """
+    build Vose's alias table for drawing indices in proportion to their
+    weights. returns the probability of keeping each index and the alias
+    drawn instead
+
+    """
+    n = len(weights)
+    scaled = np.asarray(weights, dtype=float) * n / np.sum(weights)
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = list(np.flatnonzero(scaled < 1))
+    large = list(np.flatnonzero(scaled >= 1))
+    while small and large:
+        s, g = small.pop(), large.pop()
+        prob[s] = scaled[s]
+        alias[s] = g
+        scaled[g] -= 1 - scaled[s]
+        if scaled[g] < 1:
+            small.append(g)
+        else:
+            large.append(g)
+    return prob, alias
+
+
+class BoundarySampler:
+    """
+    draws points uniformly within a Boundary. the rings are triangulated
+    once and triangles are drawn from an alias table weighted by their
+    area, with degrees of longitude shrunk by the cosine of the latitude,
+    then a point is drawn uniformly within the triangle. only the outer
+    rings are triangulated, so points are checked against the boundary to
+    exclude those in holes, which is the only reason a point is rejected.
+
+    when an origin and radius are given, points are drawn within the same
+    area around the origin, and with the same density, as
+    get_random_locations. either the triangles that overlap the area are
+    weighted by their area in degrees in a cumulative table and points
+    outside the radius are rejected, or points within the radius are drawn
+    and those outside the boundary rejected, whichever area is smaller.
+    the table for the last origin is kept for the next call. the number of
+    points drawn, accepted and the time taken are kept as stats, and points
+    sampled but not used can be discarded from them
+
+    """
+
+    def __init__(self, boundary: Boundary):
+        self.boundary = boundary
+        if boundary.triangles is None:
+            boundary.triangles = np.concatenate(
+                [triangulate_ring(polygon.outer.coords)
+                 for polygon in boundary.polygons])
+        self.triangles = boundary.triangles
+        a, b, c = (self.triangles[:, i] for i in range(3))
+        self.areas = np.abs(
+            (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]) -
+            (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1])) / 2
+        self.weights = self.areas * np.cos(np.radians(
+            self.triangles[:, :, 0].mean(axis=1)))
+        self.prob, self.alias = get_alias_table(self.weights)
+        self.min_lat = self.triangles[:, :, 0].min(axis=1)
+        self.max_lat = self.triangles[:, :, 0].max(axis=1)
+        self.min_lng = self.triangles[:, :, 1].min(axis=1)
+        self.max_lng = self.triangles[:, :, 1].max(axis=1)
+        self.disc = None
+        self.disc_table = None
+        self.drawn = 0
+        self.accepted = 0
+        self.seconds = 0.0
+
+    def get_disc_table(self, x0: float, y0: float, meters: int):
+        """
+        the triangles that overlap the area within meters of the origin and
+        their cumulative weights, or None when drawing within the radius
+        and rejecting points outside the boundary is cheaper
+
+        """
+        if self.disc != (x0, y0, meters):
+            r = meters / 111139
+            # the area drawn from by get_random_locations
+            dx = r / np.cos(y0 * (np.pi / 180))
+            overlap = np.flatnonzero(
+                (self.min_lat <= x0 + dx) & (self.max_lat >= x0 - dx) &
+                (self.min_lng <= y0 + r) & (self.max_lng >= y0 - r))
+            if not len(overlap):
+                raise ValueError('no part of the boundary is within ' +
+                                 str(meters) + ' meters of ' + str(x0) +
+                                 ', ' + str(y0))
+            self.disc = (x0, y0, meters)
+            self.disc_table = None
+            if np.sum(self.areas[overlap]) < np.pi * r * dx:
+                self.disc_table = (overlap, np.cumsum(self.areas[overlap]))
+        return self.disc_table
+
+    def draw(self, size: int, rng, table=None):
+        """ draw size points uniformly within triangles of the table """
+        if table is None:
+            index = rng.integers(len(self.prob), size=size)
+            index = np.where(rng.random(size) < self.prob[index], index,
+                             self.alias[index])
+        else:
+            overlap, cumulative = table
+            index = overlap[np.minimum(
+                np.searchsorted(cumulative,
+                                rng.random(size) * cumulative[-1],
+                                side='right'), len(overlap) - 1)]
+        a, b, c = (self.triangles[index, i] for i in range(3))
+        u = rng.random((size, 1))
+        v = rng.random((size, 1))
+        flip = (u + v) > 1
+        u, v = np.where(flip, 1 - u, u), np.where(flip, 1 - v, v)
+        points = np.round(a + u * (b - a) + v * (c - a), 6)
+        return points[:, 0], points[:, 1]
+
+    def sample(self, size: int, rng=None, x0=None, y0=None, meters=None):
+        """
+        draw size points uniformly within the boundary, or within the
+        boundary and meters of the origin, returned as two numpy arrays of
+        latitudes and longitudes rounded to 6 decimal places
+
+        """
+        start = time.perf_counter()
+        if rng is None:
+            rng = np.random.default_rng()
+        disc = meters is not None
+        if disc:
+            x0, y0 = float(x0), float(y0)
+            table = self.get_disc_table(x0, y0, meters)
+            r = meters / 111139
+        lats, lngs = np.empty(size), np.empty(size)
+        filled = 0
+        empty_rounds = 0
+        while filled < size:
+            n = size - filled
+            if disc and table is None:
+                lat, lng = get_random_locations(x0, y0, meters, n, rng)
+                keep = self.boundary.contains_points(lat, lng)
+            else:
+                lat, lng = self.draw(n, rng, table if disc else None)
+                keep = self.boundary.contains_points(lat, lng)
+                if disc:
+                    keep &= ((lat - x0) * np.cos(y0 * (np.pi / 180))) ** 2 + \
+                        (lng - y0) ** 2 <= r * r
+            accepted = np.count_nonzero(keep)
+            lats[filled:filled + accepted] = lat[keep]
+            lngs[filled:filled + accepted] = lng[keep]
+            filled += accepted
+            self.drawn += int(n)
+            empty_rounds = 0 if accepted else empty_rounds + 1
+            if empty_rounds == 100:
+                raise ValueError('no point within the boundary and ' +
+                                 str(meters) + ' meters of ' + str(x0) +
+                                 ', ' + str(y0) + ' could be drawn')
+        self.accepted += size
+        self.seconds += time.perf_counter() - start
+        return lats, lngs
+
+    def get_stats(self) -> dict:
+        """
+        the points drawn and accepted so far, the proportion rejected and
+        the average time to sample an accepted point in microseconds
+
+        """
+        return {
+            'triangles': len(self.triangles),
+            'drawn': int(self.drawn),
+            'accepted': int(self.accepted),
+            'rejection_rate': 1 - self.accepted / self.drawn
+            if self.drawn else 0.0,
+            'microseconds_per_point': self.seconds * 1e6 / self.accepted
+            if self.accepted else 0.0
+        }
+
+    def discard(self, count: int):
+        """
+        remove count points sampled but not used from the stats, along with
+        their average share of the points drawn and the time taken, so the
+        stats cover only the points used
+
+        """
+        count = min(count, self.accepted)
+        if count:
+            share = count / self.accepted
+            self.drawn -= int(round(self.drawn * share))
+            self.seconds -= self.seconds * share
+            self.accepted -= count
+
+
+# the most lists of coordinates whose prepared boundaries are kept
+PREPARED_BOUNDARIES = 8
+
+
+def simplify_ring(coords, meters: int, conservative=False, hole=False):
+    """
+    simplify a ring of latitude, longitude rows so that no vertex of the
+    ring is more than meters from the simplified ring. vertices are removed
+    in order of the deviation their removal causes, the largest distance
+    of any original vertex that the new edge replaces, as in
+    Visvalingam's algorithm, until every remaining removal would exceed
+    meters. a vertex is kept when its new edge would cross another edge
+    of the ring, so the ring does not intersect itself, and rings keep at
+    least three vertices.
+
+    a conservative simplification only removes vertices that turn away
+    from the inside of the region, so the simplified region contains the
+    original. hole is set for the holes of a polygon, whose inside is
+    outside the region. returns the simplified ring and its maximum
+    deviation in meters
+
+    """
+    n = len(coords)
+    if n <= 3:
+        return coords, 0.0
+    lats, lngs = coords[:, 0], coords[:, 1]
+    # plane of meters, with longitude shrunk at the ring's latitude, for
+    # the turns and crossings of edges
+    y = coords[:, 0] * 111139
+    x = coords[:, 1] * 111139 * np.cos(np.radians(coords[:, 0].mean()))
+    # turns towards the inside of the region are positive
+    ccw = np.dot(x, np.roll(y, -1)) > np.dot(np.roll(x, -1), y)
+    inside = 1 if ccw != hole else -1
+    prev = np.r_[n - 1, np.arange(n - 1)]
+    next = np.r_[np.arange(1, n), 0]
+    alive = np.ones(n, dtype=bool)
+    version = np.zeros(n, dtype=int)
+
+    def run(a, c):
+        """ the original vertices between a and c """
+        if a < c:
+            return np.arange(a + 1, c)
+        return np.r_[np.arange(a + 1, n), np.arange(0, c)]
+
+    def get_deviations(a, c, points):
+        """
+        the distances in meters of points from the edges a to c. the
+        nearest point of an edge is found with longitude shrunk at the
+        latitude of the point rather than of the ring, and its distance
+        measured along the great circle, so the distances hold for rings
+        that span many degrees of latitude
+
+        """
+        k = np.cos(np.radians(lats[points]))
+        dlat, dlng = lats[c] - lats[a], lngs[c] - lngs[a]
+        py, px, dx = lats[points] - lats[a], (lngs[points] - lngs[a]) * k, \
+            dlng * k
+        length = dx * dx + dlat * dlat
+        t = np.clip((px * dx + py * dlat) / np.where(length > 0, length, 1),
+                    0, 1)
+        return get_distances(lats[points], lngs[points], lats[a] + t * dlat,
+                             lngs[a] + t * dlng) * METERS_PER_MILE
+
+    def deviation(a, c, points):
+        """ the largest distance of points from the edge a to c """
+        return float(np.max(get_deviations(a, c, points)))
+
+    def crosses(a, c):
+        """ determines if the edge a to c crosses an edge of the ring """
+        e0 = np.flatnonzero(alive)
+        e1 = next[e0]
+        # only edges whose bounding box overlaps the new edge can cross it
+        x0, x1, y0, y1 = x[e0], x[e1], y[e0], y[e1]
+        keep = (np.minimum(x0, x1) <= max(x[a], x[c])) & \
+            (np.maximum(x0, x1) >= min(x[a], x[c])) & \
+            (np.minimum(y0, y1) <= max(y[a], y[c])) & \
+            (np.maximum(y0, y1) >= min(y[a], y[c]))
+        e0, e1 = e0[keep], e1[keep]
+        keep = (e0 != a) & (e1 != a) & (e0 != c) & (e1 != c)
+        e0, e1 = e0[keep], e1[keep]
+
+        def turn(p, q, r):
+            return np.sign((x[q] - x[p]) * (y[r] - y[p]) -
+                           (y[q] - y[p]) * (x[r] - x[p]))
+
+        return bool(np.any((turn(a, c, e0) * turn(a, c, e1) < 0) &
+                           (turn(e0, e1, a) * turn(e0, e1, c) < 0)))
+
+    heap = list(zip(get_deviations(prev, next, np.arange(n)).tolist(),
+                    range(n), [0] * n))
+    heapq.heapify(heap)
+    remaining = n
+    while heap and remaining > 3:
+        cost, i, v = heapq.heappop(heap)
+        if cost > meters:
+            break
+        if not alive[i] or v != version[i]:
+            continue
+        a, c = prev[i], next[i]
+        turn = (x[i] - x[a]) * (y[c] - y[a]) - (y[i] - y[a]) * (x[c] - x[a])
+        if (conservative and turn * inside > 0) or crosses(a, c):
+            continue
+        alive[i] = False
+        next[a], prev[c] = c, a
+        remaining -= 1
+        for j in (a, c):
+            version[j] += 1
+            heapq.heappush(heap, (deviation(prev[j], next[j],
+                                            run(prev[j], next[j])),
+                                  j, version[j]))
+
+    kept = np.flatnonzero(alive)
+    deviations = [deviation(i, next[i], run(i, next[i])) for i in kept
+                  if next[i] != (i + 1) % n]
+    return coords[kept], max(deviations, default=0.0)
+
+
+def simplify_boundary(boundary: Boundary, meters: int, conservative=False):
+    """
+    simplify every ring of a boundary with simplify_ring. returns the
+    simplified boundary, whose simplification attribute is a dict of the
+    number of vertices before and after and the maximum deviation in
+    meters
+
     """
-    determines if a point is within a 2D polygon. the polygon shape is
-    completed by the modulus operator. Given the coordinate list of A,B,C,D
-    we process A,B,C,D,A. we use latitude and longitude coordinates to
-    determine each point of our polygon.  we expect coordinates as a list
-    of strings that we convert to floats e.g
-    '60.6733322143556,-0.835000038146973'
+    polygons = []
+    before = after = 0
+    deviation = 0.0
+    for polygon in boundary.polygons:
+        rings = []
+        for hole, ring in enumerate([polygon.outer] + polygon.holes):
+            coords, d = simplify_ring(ring.coords, meters, conservative,
+                                      hole > 0)
+            before += len(ring.coords)
+            after += len(coords)
+            deviation = max(deviation, d)
+            rings.append(coords)
+        polygons.append(rings)
+    simplified = Boundary(polygons)
+    simplified.simplification = {
+        'vertices': before,
+        'simplified_vertices': after,
+        'max_deviation': deviation
+    }
+    return simplified
+
+
+def format_simplification_report(stats: dict) -> str:
+    """ summarise the vertex reduction and deviation of a simplification """
+    return ('boundary simplified from ' + str(stats['vertices']) + ' to ' +
+            str(stats['simplified_vertices']) + ' vertices (' +
+            '%.1f' % (100 - stats['simplified_vertices'] * 100 /
+                      stats['vertices']) +
+            '% fewer), maximum deviation ' + '%.0f' % stats['max_deviation'] +
+            ' meters')
+
+
+def is_within_boundary(lat: float, lng: float, poly) -> bool:
+    """
+    determines if a point is within a boundary, a Boundary prepared by
+    load_boundary or get_prepared_boundary, or a list of "lat,lng" strings
+    of a single ring e.g. '60.6733322143556,-0.835000038146973'. a prepared
+    boundary only tests the edges in the point's longitude slab, as
+    described by Ring. a list is copied and hashed on every call to find
+    its prepared Boundary among the last few, which takes time in
+    proportion to its length, so a list tested repeatedly should be
+    prepared once with get_prepared_boundary and the Boundary passed
+    instead
 
     https://www.eecs.umich.edu/courses/eecs380/HANDOUTS/PROJ2/InsidePoly.html
+    """
+    return get_prepared_boundary(poly).contains(float(lat), float(lng))
 
-    an alternative would be to use matplotlib Path class and contains_point
-    function
-    """
-    n = len(poly)
-    result = False
-
-    x0, y0 = str(poly[0]).split(',')
-    for i in range(n + 1):
-        x1, y1 = str(poly[i % n]).split(',')
-        if lng > min(float(y0), float(y1)):
-            if lng <= max(float(y0), float(y1)):
-                if lat <= max(float(x0), float(x1)):
-                    if float(y0) != float(y1):
-                        xinters = float(x0) + (float(lng) - float(y0)) * \
-                            (float(x1) - float(x0)) / \
-                            (float(y1) - float(y0))
-                    if float(x0) == float(x1) or float(
-                            lat) <= float(xinters):
-                        result = not result
-                        return result
-        x0, y0 = x1, y1
 
-    return result
+def get_boundary_mask(lats, lngs, poly):
+    """
+    array version of is_within_boundary. returns a numpy boolean mask of
+    the latitude and longitude pairs within the boundary
+
+    """
+    return get_prepared_boundary(poly).contains_points(lats, lngs)
+
+
+@functools.lru_cache(maxsize=PREPARED_BOUNDARIES)
+def prepare_ring(coords: tuple) -> Boundary:
+    """ the Boundary of a single ring of a tuple of "lat,lng" strings """
+    return Boundary([[list(coords)]])
+
+
+def get_prepared_boundary(poly) -> Boundary:
+    """
+    returns a Boundary as is, or prepares a list of "lat,lng" strings as a
+    Boundary of a single ring. the list is copied to a tuple for the cache
+    of prepare_ring, so a list changed in place is prepared again
+
+    """
+    if isinstance(poly, Boundary):
+        return poly
+    return prepare_ring(tuple(poly))
 
 
-def extract_geojson_coordinates(file_name: str) -> list:
+def load_boundary(file_name: str, cache=True, meters=None,
+                  conservative=False) -> Boundary:
     """
-    note that GeoJSON orders coordinates as longitude, latitude. we need them
-    in the normal convention of latitude, longitude.  it is normal for
-    geographic boundaries to be represented using the MultiPolygon datatype in
-    GeoJSON. we want each coordinate to be represented like this
-    58.3177719116212,-6.23250007629395,
+    read the Polygon and MultiPolygon features of a GeoJSON boundary file
+    and prepare them for containment tests, simplified by simplify_boundary
+    when meters is given. when cache is set the prepared boundary is memory
+    mapped from its geocache file, which is written the first time the
+    file is read with the same simplification
+
+    """
+    if cache:
+        import geocache
+
+        return geocache.load_boundary(file_name, meters, conservative)
+    boundary = Boundary(extract_geojson_polygons(file_name))
+    if meters:
+        boundary = simplify_boundary(boundary, meters, conservative)
+    return boundary
+
+
+def extract_geojson_polygons(file_name: str) -> list:
+    """
+    read the polygons of the Polygon and MultiPolygon features of a GeoJSON
+    file. each polygon is a list of rings, the outer ring first and then
+    any holes, and each ring is an array of latitude, longitude rows. note
+    that GeoJSON orders coordinates as longitude, latitude and repeats the
+    first coordinate of a ring at its end
+
     """
     try:
         f = open(file_name, 'r')
@@ -126,29 +972,24 @@ def extract_geojson_coordinates(file_name: str) -> list:
     except (ValueError):
         raise SystemExit('File is not a valid JSON document.')
 
-    boundary = ''
-    lst = []
+    polygons = []
     for t in data['features']:
-        all_coords = list(
-            it.chain.from_iterable(
-                t['geometry']['coordinates']))
-        for c in all_coords:
-            x = str(
-                str(c).replace(
-                    '[', '').replace(
-                    ']', '')).split(',')
-            multipoint_length = len(x)
-            for i in range(0, multipoint_length - 1, 2):
-                if i == 0:
-                    pair = x[i + 1] + ',' + x[i]
-                elif i == int(multipoint_length - 2):
-                    pair = ':'
-                else:
-                    pair = ':' + x[i + 1] + ',' + x[i]
-                boundary += pair.replace('"', '')
-            boundary = boundary.replace(' ', '')
-            lst.append(boundary)
-        boundary = boundary[:-1]
-    boundary = boundary[:-1]
-    lst = list(boundary.split(':'))
-    return(lst)
+        geometry = t['geometry']
+        coordinates = geometry['coordinates']
+        if geometry['type'] == 'Polygon':
+            coordinates = [coordinates]
+        elif geometry['type'] != 'MultiPolygon':
+            continue
+        for polygon in coordinates:
+            rings = []
+            for ring in polygon:
+                ring = np.array(ring, dtype=float)[:, 1::-1]
+                if len(ring) > 1 and (ring[0] == ring[-1]).all():
+                    ring = ring[:-1]
+                if len(ring) >= 3:
+                    rings.append(np.ascontiguousarray(ring))
+            if rings:
+                polygons.append(rings)
+    if not polygons:
+        raise SystemExit('File ' + file_name + ' has no polygons.')
+    return polygons
@@ -0,0 +1,297 @@
+# -----------------------------------------------------------
+# compiled boundary cache. reading a GeoJSON boundary file,
+# indexing its rings and triangulating them for sampling
+# takes far longer than reading the resulting arrays, so the
+# prepared arrays are saved in an uncompressed .npz file next
+# to the GeoJSON file, e.g. data/ca.geojson is cached in
+# data/ca.geojson.npz, and memory mapped by later runs.
+# boundaries simplified with a tolerance are cached
+# separately e.g. data/ca.geojson.1000m.npz or, for a
+# conservative simplification, data/ca.geojson.1000m-outer.npz
+#
+# a cache is used when the size of the GeoJSON file is the
+# same and either its path and modification time or the
+# SHA-1 hash of its content match those saved in the cache
+#
+# https://github.com/FixTheCode CC0 1.0 Universal
+# -----------------------------------------------------------
+import os
+import sys
+import mmap
+import time
+import struct
+import hashlib
+import zipfile
+import argparse
+
+import numpy as np
+
+import geo
+
+# the version of the cache format and of the simplification it holds
+VERSION = 2
+
+# the file name extension added to the GeoJSON file name
+EXTENSION = '.npz'
+
+
+def get_cache_name(file_name: str, meters=None, conservative=False) -> str:
+    """
+    the name of the cache file of a GeoJSON file, simplified with a
+    tolerance of meters when given
+
+    """
+    if meters:
+        file_name += '.' + str(int(meters)) + 'm'
+        if conservative:
+            file_name += '-outer'
+    return file_name + EXTENSION
+
+
+def get_file_hash(file_name: str) -> str:
+    """ the SHA-1 hash of the content of a file """
+    digest = hashlib.sha1()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_key(file_name: str) -> dict:
+    """
+    the path, size and modification time of a GeoJSON file that a cache
+    is checked against
+
+    """
+    stat = os.stat(file_name)
+    return {
+        'path': os.path.abspath(file_name),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns
+    }
+
+
+def is_valid(arrays: dict, file_name: str) -> bool:
+    """
+    determines if cache arrays were saved from the GeoJSON file as it is
+    now. the content hash is only calculated when the path or
+    modification time differ, e.g. after a checkout or copy
+
+    """
+    key = get_key(file_name)
+    if int(arrays['version']) != VERSION or int(arrays['size']) != \
+            key['size']:
+        return False
+    if str(arrays['path']) == key['path'] and \
+            int(arrays['mtime']) == key['mtime']:
+        return True
+    return str(arrays['sha1']) == get_file_hash(file_name)
+
+
+def save_cache(boundary, file_name: str, meters=None, conservative=False):
+    """
+    save the rings, slab indexes and sampling triangles of a boundary read
+    from a GeoJSON file, and simplified with a tolerance of meters when
+    given, to its cache file. the cache is written to a
+    temporary file that replaces the cache at once, so that processes
+    reading the cache at the same time never see a partial file
+
+    """
+    rings = [ring for polygon in boundary.polygons
+             for ring in [polygon.outer] + polygon.holes]
+    indexes = [ring.get_index() for ring in rings]
+    key = get_key(file_name)
+    arrays = {
+        'version': np.array(VERSION),
+        'path': np.array(key['path']),
+        'size': np.array(key['size'], dtype=np.int64),
+        'mtime': np.array(key['mtime'], dtype=np.int64),
+        'sha1': np.array(get_file_hash(file_name)),
+        'coords': np.concatenate([ring.coords for ring in rings]),
+        'ring_starts': np.cumsum([0] + [len(r.coords) for r in rings]),
+        'polygon_starts': np.cumsum(
+            [0] + [1 + len(p.holes) for p in boundary.polygons]),
+        'edges': np.concatenate([np.array(index[1:5]) for index in indexes],
+                                axis=1),
+        'edge_starts': np.cumsum([0] + [len(index[1]) for index in indexes]),
+        'offsets': np.concatenate([index[0] for index in indexes]),
+        'offset_starts': np.cumsum([0] + [len(index[0])
+                                          for index in indexes]),
+        'slab_widths': np.array([index[5] for index in indexes]),
+        'triangles': boundary.get_sampler().triangles
+    }
+    if boundary.simplification:
+        arrays['simplification'] = np.array([
+            boundary.simplification['vertices'],
+            boundary.simplification['simplified_vertices'],
+            boundary.simplification['max_deviation']])
+    cache_name = get_cache_name(file_name, meters, conservative)
+    temp_name = cache_name + '.' + str(os.getpid()) + '.tmp'
+    with open(temp_name, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(temp_name, cache_name)
+
+
+def read_npz(file_name: str) -> dict:
+    """
+    memory map the arrays of an uncompressed .npz file. np.load reads
+    every array of an .npz file into memory, so the offset of each array
+    within the zip file is found from its headers and the arrays are views
+    of one read only memory map
+
+    """
+    arrays = {}
+    with open(file_name, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with zipfile.ZipFile(f) as z:
+            for info in z.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(info.filename + ' is compressed')
+                # the local file header is 30 bytes then the file name
+                # and extra field
+                names, extra = struct.unpack(
+                    '<HH', data[info.header_offset + 26:
+                                info.header_offset + 30])
+                f.seek(info.header_offset + 30 + names + extra)
+                if np.lib.format.read_magic(f) == (1, 0):
+                    header = np.lib.format.read_array_header_1_0(f)
+                else:
+                    header = np.lib.format.read_array_header_2_0(f)
+                shape, fortran, dtype = header
+                array = np.frombuffer(data, dtype=dtype,
+                                      count=int(np.prod(shape)),
+                                      offset=f.tell())
+                arrays[info.filename[:-4]] = array.reshape(
+                    shape, order='F' if fortran else 'C')
+    return arrays
+
+
+def load_cache(file_name: str, meters=None, conservative=False):
+    """
+    read the boundary of a GeoJSON file, simplified with a tolerance of
+    meters when given, from its cache file, or None when there is no valid
+    cache
+
+    """
+    try:
+        arrays = read_npz(get_cache_name(file_name, meters, conservative))
+        if not is_valid(arrays, file_name):
+            return None
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        return None
+
+    coords, edges, offsets = arrays['coords'], arrays['edges'], \
+        arrays['offsets']
+    ring_starts = arrays['ring_starts']
+    edge_starts = arrays['edge_starts']
+    offset_starts = arrays['offset_starts']
+    rings = []
+    for i, slab_width in enumerate(arrays['slab_widths'].tolist()):
+        e0, e1 = edge_starts[i], edge_starts[i + 1]
+        rings.append(geo.Ring(
+            coords[ring_starts[i]:ring_starts[i + 1]],
+            index=(offsets[offset_starts[i]:offset_starts[i + 1]],
+                   edges[0, e0:e1], edges[1, e0:e1], edges[2, e0:e1],
+                   edges[3, e0:e1], slab_width)))
+    starts = arrays['polygon_starts']
+    polygons = [geo.Polygon(rings[starts[i]:starts[i + 1]])
+                for i in range(len(starts) - 1)]
+    boundary = geo.Boundary(polygons, arrays['triangles'])
+    if 'simplification' in arrays:
+        vertices, simplified, deviation = arrays['simplification'].tolist()
+        boundary.simplification = {
+            'vertices': int(vertices),
+            'simplified_vertices': int(simplified),
+            'max_deviation': deviation
+        }
+    return boundary
+
+
+def load_boundary(file_name: str, meters=None, conservative=False):
+    """
+    read the boundary of a GeoJSON file, simplified with a tolerance of
+    meters when given, from its cache file, or prepare it and save its
+    cache file when there is no valid cache. a simplified boundary is
+    prepared from the cached boundary of the file. a cache that cannot be
+    written, e.g. in a read only directory, is skipped
+
+    """
+    boundary = load_cache(file_name, meters, conservative)
+    if boundary is None:
+        if meters:
+            boundary = geo.simplify_boundary(load_boundary(file_name),
+                                             meters, conservative)
+        else:
+            boundary = geo.load_boundary(file_name, cache=False)
+        try:
+            save_cache(boundary, file_name, meters, conservative)
+        except (OSError):
+            pass
+    return boundary
+
+
+def main():
+    """
+    build the cache of every GeoJSON file in a directory, simplified with
+    a tolerance when given, reporting the time to build and then to load
+    each
+
+    """
+    meters = int(args.boundary_tolerance or 0)
+    conservative = args.boundary_outer
+    try:
+        file_names = sorted(f for f in os.listdir(args.d)
+                            if f.endswith('.geojson'))
+    except (FileNotFoundError):
+        raise SystemExit('Directory ' + args.d + ' not found.')
+    for name in file_names:
+        file_name = os.path.join(args.d, name)
+        start = time.perf_counter()
+        boundary = None if args.force else load_cache(file_name, meters,
+                                                      conservative)
+        if boundary is None:
+            boundary = geo.load_boundary(file_name, cache=False)
+            if meters:
+                boundary = geo.simplify_boundary(boundary, meters,
+                                                 conservative)
+            save_cache(boundary, file_name, meters, conservative)
+            status = 'built in '
+        else:
+            status = 'up to date, checked in '
+        built = time.perf_counter() - start
+        start = time.perf_counter()
+        load_cache(file_name, meters, conservative)
+        loaded = time.perf_counter() - start
+        print(file_name + ' ' + str(len(boundary.polygons)) + ' polygons, ' +
+              str(len(boundary.triangles)) + ' triangles, ' + status +
+              '%.3f' % built + 's, loads in ' + '%.3f' % loaded + 's',
+              file=sys.stderr)
+        if boundary.simplification:
+            print(geo.format_simplification_report(boundary.simplification),
+                  file=sys.stderr)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '-d',
+        default='data',
+        metavar='DIR',
+        help='directory of GeoJSON files to cache')
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='rebuild caches that are up to date')
+    parser.add_argument(
+        '--boundary-tolerance',
+        required=False,
+        metavar='METERS',
+        help='cache boundaries simplified to within this many meters')
+    parser.add_argument(
+        '--boundary-outer',
+        action='store_true',
+        help='simplify conservatively so boundaries only grow')
+    args = parser.parse_args()
+
+    main()
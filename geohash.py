@@ -0,0 +1,231 @@
+# -----------------------------------------------------------
+# geohash encoding of latitude and longitude coordinates, so
+# that records can be bucketed into spatial cells by a
+# string or integer key. a geohash of precision p is 5p bits
+# alternating longitude and latitude halvings, starting with
+# longitude, written in a base 32 alphabet. nearby locations
+# share a prefix and each extra character divides a cell
+# into 32, e.g. precision 5 cells are about 5 km across and
+# precision 7 cells about 150 m
+#
+# coordinates are quantised to integers and the bits are
+# interleaved with integer operations on whole NumPy arrays,
+# so no float arithmetic is repeated per bit or per record
+#
+# http://geohash.org/ https://en.wikipedia.org/wiki/Geohash
+#
+# https://github.com/FixTheCode CC0 1.0 Universal
+# -----------------------------------------------------------
+import numpy as np
+
+ALPHABET = b'0123456789bcdefghjkmnpqrstuvwxyz'
+
+# the most characters, 60 bits, that fit a 64 bit integer
+MAX_PRECISION = 12
+
+# the value of each byte of a geohash, or 255 for invalid characters
+DIGITS = np.full(256, 255, dtype=np.uint8)
+DIGITS[np.frombuffer(ALPHABET, dtype=np.uint8)] = np.arange(32)
+DIGITS[np.frombuffer(ALPHABET.upper(), dtype=np.uint8)] = np.arange(32)
+
+# directions of the neighbours returned by get_neighbours
+NEIGHBOURS = ('n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw')
+NEIGHBOUR_STEPS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1),
+                   (0, -1), (1, -1))
+
+
+def check_precision(precision) -> int:
+    """ validate a geohash precision as a number of characters """
+    precision = int(precision)
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError('geohash precision must be 1 to ' +
+                         str(MAX_PRECISION))
+    return precision
+
+
+def get_bits(precision: int) -> tuple:
+    """ the number of latitude and longitude bits of a precision """
+    bits = 5 * precision
+    return (bits // 2, bits - bits // 2)
+
+
+def spread(values):
+    """ move bit i of 32 bit integers to bit 2i, leaving gaps of zeros """
+    v = values.astype(np.uint64)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def compact(values):
+    """ the inverse of spread, gathering the even bits of integers """
+    v = values.astype(np.uint64) & np.uint64(0x5555555555555555)
+    v = (v | (v >> np.uint64(1))) & np.uint64(0x3333333333333333)
+    v = (v | (v >> np.uint64(2))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v >> np.uint64(4))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v >> np.uint64(8))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v >> np.uint64(16))) & np.uint64(0x00000000FFFFFFFF)
+    return v
+
+
+def interleave(rows, cols, precision: int):
+    """
+    the integer geohash of the latitude rows and longitude columns of
+    cells. the top bit is longitude's, so when there is an odd number of
+    bits longitude has one more
+
+    """
+    if (5 * precision) % 2:
+        return spread(cols) | (spread(rows) << np.uint64(1))
+    return (spread(cols) << np.uint64(1)) | spread(rows)
+
+
+def deinterleave(codes, precision: int) -> tuple:
+    """ the latitude rows and longitude columns of integer geohashes """
+    codes = np.asarray(codes, dtype=np.uint64)
+    if (5 * precision) % 2:
+        return (compact(codes >> np.uint64(1)).astype(np.int64),
+                compact(codes).astype(np.int64))
+    return (compact(codes).astype(np.int64),
+            compact(codes >> np.uint64(1)).astype(np.int64))
+
+
+def get_cells(lats, lngs, precision: int) -> tuple:
+    """
+    the latitude row and longitude column of the cells of a precision
+    holding coordinates. latitude 90 and longitude 180 are held in the
+    last row and column
+
+    """
+    lat_bits, lng_bits = get_bits(precision)
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    rows = np.floor((lats + 90) * (2 ** lat_bits / 180)).astype(np.int64)
+    cols = np.floor((lngs + 180) * (2 ** lng_bits / 360)).astype(np.int64)
+    return (np.clip(rows, 0, 2 ** lat_bits - 1),
+            np.clip(cols, 0, 2 ** lng_bits - 1))
+
+
+def encode_int(lats, lngs, precision=9):
+    """
+    the integer geohashes of arrays of latitudes and longitudes, 5 bits a
+    character. integer geohashes sort in the same order as their strings
+
+    """
+    precision = check_precision(precision)
+    return interleave(*get_cells(lats, lngs, precision), precision)
+
+
+def to_strings(codes, precision: int):
+    """ the geohash strings of integer geohashes of a precision """
+    codes = np.asarray(codes, dtype=np.uint64)
+    shifts = np.uint64(5) * np.arange(precision - 1, -1, -1,
+                                      dtype=np.uint64)
+    digits = (codes[..., None] >> shifts) & np.uint64(31)
+    chars = np.frombuffer(ALPHABET, dtype=np.uint8)[digits]
+    return np.ascontiguousarray(chars).view('S' + str(precision))[
+        ..., 0].astype('U')
+
+
+def from_strings(hashes) -> tuple:
+    """
+    the integer geohashes and precision of an array of geohash strings,
+    which must all have the same number of characters
+
+    """
+    hashes = np.asarray(hashes)
+    precision = check_precision(hashes.dtype.itemsize //
+                                (4 if hashes.dtype.kind == 'U' else 1))
+    chars = np.frombuffer(hashes.astype('S' + str(precision)).tobytes(),
+                          dtype=np.uint8).reshape(hashes.shape + (precision,))
+    digits = DIGITS[chars]
+    if (digits == 255).any():
+        raise ValueError('invalid geohash, expected ' + str(precision) +
+                         ' characters of ' + ALPHABET.decode())
+    codes = np.zeros(hashes.shape, dtype=np.uint64)
+    for i in range(precision):
+        codes = (codes << np.uint64(5)) | digits[..., i].astype(np.uint64)
+    return (codes, precision)
+
+
+def encode(lats, lngs, precision=9):
+    """
+    the geohash strings of arrays of latitudes and longitudes e.g.
+
+        geohash.encode([51.501], [-0.1419], 7)    # ['gcpuuz2']
+
+    """
+    precision = check_precision(precision)
+    return to_strings(encode_int(lats, lngs, precision), precision)
+
+
+def get_bounds(rows, cols, precision: int) -> tuple:
+    """ the south, north, west and east edges of cells of a precision """
+    lat_bits, lng_bits = get_bits(precision)
+    lat_size = 180 / 2 ** lat_bits
+    lng_size = 360 / 2 ** lng_bits
+    return (rows * lat_size - 90, (rows + 1) * lat_size - 90,
+            cols * lng_size - 180, (cols + 1) * lng_size - 180)
+
+
+def decode_bounds(hashes) -> tuple:
+    """
+    the south, north, west and east edges of the cells of an array of
+    geohash strings
+
+    """
+    codes, precision = from_strings(hashes)
+    return get_bounds(*deinterleave(codes, precision), precision)
+
+
+def decode(hashes) -> tuple:
+    """
+    the latitudes and longitudes of the centres of the cells of an array
+    of geohash strings
+
+    """
+    south, north, west, east = decode_bounds(hashes)
+    return ((south + north) / 2, (west + east) / 2)
+
+
+def get_neighbours(hashes):
+    """
+    the eight neighbouring cells of an array of geohash strings, as an
+    array with a column for each direction of NEIGHBOURS. neighbours wrap
+    across the antimeridian and cells beyond the poles are empty strings
+
+    """
+    codes, precision = from_strings(hashes)
+    rows, cols = deinterleave(codes, precision)
+    lat_bits, lng_bits = get_bits(precision)
+    neighbours = np.empty(codes.shape + (len(NEIGHBOUR_STEPS),),
+                          dtype='U' + str(precision))
+    for i, (up, right) in enumerate(NEIGHBOUR_STEPS):
+        r = rows + up
+        c = (cols + right) % 2 ** lng_bits
+        outside = (r < 0) | (r >= 2 ** lat_bits)
+        neighbours[..., i] = np.where(outside, '', to_strings(interleave(
+            np.clip(r, 0, 2 ** lat_bits - 1), c, precision), precision))
+    return neighbours
+
+
+def get_prefix_range(prefixes, precision: int) -> tuple:
+    """
+    the range of integer geohashes of a precision that start with each of
+    an array of prefixes, from first up to but not including last, e.g.
+    to find the records of a cell in an array of sorted integer geohashes
+
+        first, last = geohash.get_prefix_range(['gcpv'], 9)
+        start, stop = np.searchsorted(codes, [first[0], last[0]])
+
+    """
+    codes, length = from_strings(prefixes)
+    precision = check_precision(precision)
+    if length > precision:
+        raise ValueError('geohash prefix longer than precision ' +
+                         str(precision))
+    shift = np.uint64(5 * (precision - length))
+    return (codes << shift, (codes + np.uint64(1)) << shift)
@@ -0,0 +1,301 @@
+# -----------------------------------------------------------
+# spatial index of latitude and longitude coordinates for
+# nearest neighbour and radius queries, e.g. the nearest cell
+# tower to a call or all calls within a distance of a point.
+#
+# coordinates are converted to points on the unit sphere and
+# held in a balanced k-d tree, so the index has no seams at
+# the poles or the antimeridian. the straight line chord
+# between two points gives the great circle distance in miles
+# exactly as the haversine formula of geo.get_distances does.
+#
+# queries are answered in blocks of queries at a time. the
+# tree is searched one level at a time for every query of a
+# block together, keeping the (query, node) pairs whose
+# bounding box is close enough to hold an answer, so there
+# is no Python loop over queries or nodes.
+#
+# https://github.com/FixTheCode CC0 1.0 Universal
+# -----------------------------------------------------------
+import numpy as np
+
+import geo
+
+# the most points in a leaf of the tree
+LEAF_SIZE = 32
+
+# the number of queries searched together
+QUERY_BLOCK = 4096
+
+
+def get_xyz(lats, lngs) -> np.ndarray:
+    """ the points on the unit sphere of latitude and longitude arrays """
+    lat = np.radians(np.asarray(lats, dtype=float).ravel())
+    lng = np.radians(np.asarray(lngs, dtype=float).ravel())
+    return np.stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng),
+                     np.sin(lat)], axis=1)
+
+
+def get_miles(chords):
+    """ the great circle distances in miles of chords of the unit sphere """
+    return (2 * geo.RADIUS_MILES) * np.arcsin(np.minimum(chords / 2, 1))
+
+
+def get_chord(miles: float) -> float:
+    """ the chord of the unit sphere of a great circle distance in miles """
+    return 2 * np.sin(min(miles / (2 * geo.RADIUS_MILES), np.pi / 2))
+
+
+def get_chords(a, b):
+    """
+    the straight line distances between aligned points on the unit sphere.
+    differences are used rather than dot products so that short distances
+    keep their precision
+
+    """
+    d = a - b
+    return np.sqrt(np.einsum('ij,ij->i', d, d))
+
+
+class PointIndex:
+    """
+    a k-d tree of latitude and longitude points. the tree is balanced and
+    held in arrays: node i has children 2i + 1 and 2i + 2, covers the
+    points order[starts[i]:ends[i]] and has the bounding box lo[i] to
+    hi[i]. a tree returned by get_tree, such as one read by load_index,
+    can be given so the points are not indexed again
+
+    """
+
+    def __init__(self, lats, lngs, leaf_size=LEAF_SIZE, tree=None):
+        self.lats = np.asarray(lats, dtype=float).ravel()
+        self.lngs = np.asarray(lngs, dtype=float).ravel()
+        if not len(self.lats):
+            raise ValueError('no points to index')
+        self.xyz = get_xyz(self.lats, self.lngs)
+        if tree is not None:
+            self.order, self.starts, self.ends, self.lo, self.hi = tree
+        else:
+            self.build(leaf_size)
+        self.depth = int(np.log2(len(self.starts) + 1)) - 1
+
+    def build(self, leaf_size: int):
+        """
+        split the points in half at the median of the widest side of each
+        node's bounding box, one level at a time, until the nodes hold at
+        most leaf_size points. each level sorts every node's points by
+        its split coordinate at once
+
+        """
+        n = len(self.xyz)
+        depth = int(np.ceil(np.log2(n / leaf_size))) if n > leaf_size else 0
+        order = np.arange(n)
+        starts, ends = np.array([0]), np.array([n])
+        levels = []
+        for d in range(depth + 1):
+            xyz = self.xyz[order]
+            lo = np.minimum.reduceat(xyz, starts, axis=0)
+            hi = np.maximum.reduceat(xyz, starts, axis=0)
+            levels.append((starts, ends, lo, hi))
+            if d == depth:
+                break
+            node = np.repeat(np.arange(len(starts)), ends - starts)
+            axis = np.argmax(hi - lo, axis=1)
+            order = order[np.lexsort((xyz[np.arange(n), axis[node]], node))]
+            mids = (starts + ends) // 2
+            starts = np.stack([starts, mids], axis=1).ravel()
+            ends = np.stack([mids, ends], axis=1).ravel()
+        self.order = order
+        self.starts, self.ends, self.lo, self.hi = (
+            np.concatenate(a) for a in zip(*levels))
+
+    def get_tree(self) -> tuple:
+        """ the arrays of the tree, as saved by save """
+        return self.order, self.starts, self.ends, self.lo, self.hi
+
+    def get_box_chords(self, xyz, nodes):
+        """ the distance from each point to the bounding box of its node """
+        d = np.maximum(np.maximum(self.lo[nodes] - xyz, xyz - self.hi[nodes]),
+                       0)
+        return np.sqrt(np.einsum('ij,ij->i', d, d))
+
+    def get_far_chords(self, xyz, nodes):
+        """ the distance from each point to the far corner of its node """
+        d = np.maximum(np.abs(self.lo[nodes] - xyz),
+                       np.abs(xyz - self.hi[nodes]))
+        return np.sqrt(np.einsum('ij,ij->i', d, d))
+
+    def tighten(self, xyz, queries, leaves, bounds, k: int):
+        """
+        narrow (query, leaf) pairs found by search to those within a
+        tighter bound. every point of a leaf is no further from a query
+        than the far corner of the leaf, so the kth nearest point is no
+        further than the nearest far corner with k points in its leaves
+
+        """
+        far = self.get_far_chords(xyz[queries], leaves)
+        order = np.argsort(far, kind='stable')
+        order = order[np.argsort(queries[order], kind='stable')]
+        sizes = (self.ends - self.starts)[leaves[order]]
+        totals = np.cumsum(sizes)
+        firsts = np.r_[0, np.flatnonzero(np.diff(queries[order])) + 1]
+        totals -= np.repeat(totals[firsts] - sizes[firsts],
+                            np.diff(np.r_[firsts, len(order)]))
+        reached = order[totals >= k]
+        bounds = bounds.copy()
+        np.minimum.at(bounds, queries[reached], far[reached])
+        keep = self.get_box_chords(xyz[queries], leaves) <= \
+            bounds[queries] * (1 + 1e-12) + 1e-15
+        return queries[keep], leaves[keep], bounds
+
+    def descend(self, xyz, depth: int):
+        """ the node at depth nearest to each point, followed from the root """
+        nodes = np.zeros(len(xyz), dtype=np.int64)
+        for d in range(depth):
+            left, right = 2 * nodes + 1, 2 * nodes + 2
+            nodes = np.where(self.get_box_chords(xyz, left) <=
+                             self.get_box_chords(xyz, right), left, right)
+        return nodes
+
+    def search(self, xyz, bounds):
+        """
+        the (query, leaf) pairs of the leaves within the bound of each
+        query, searching the tree one level at a time
+
+        """
+        queries = np.arange(len(xyz))
+        nodes = np.zeros(len(xyz), dtype=np.int64)
+        # allow for rounding so that points at the bound are kept
+        bounds = bounds * (1 + 1e-12) + 1e-15
+        for d in range(self.depth + 1):
+            keep = self.get_box_chords(xyz[queries], nodes) <= bounds[queries]
+            queries, nodes = queries[keep], nodes[keep]
+            if d < self.depth:
+                queries = np.repeat(queries, 2)
+                nodes = (2 * np.repeat(nodes, 2) + 1 +
+                         np.tile([0, 1], len(nodes)))
+        return queries, nodes
+
+    def expand(self, queries, nodes):
+        """ the (query, point) pairs of the points of (query, node) pairs """
+        sizes = self.ends[nodes] - self.starts[nodes]
+        offsets = np.repeat(self.starts[nodes] - np.cumsum(sizes) + sizes,
+                            sizes)
+        return (np.repeat(queries, sizes),
+                self.order[offsets + np.arange(len(offsets))])
+
+    def get_pairs(self, xyz, queries, points, bounds):
+        """
+        the (query, point) pairs within the bound of their query, sorted by
+        query then distance, with their chords and the rank of each point
+        among those of its query. the pairs must be grouped by query
+
+        """
+        chords = get_chords(xyz[queries], self.xyz[points])
+        keep = chords <= bounds[queries] * (1 + 1e-12) + 1e-15
+        queries, points, chords = queries[keep], points[keep], chords[keep]
+        order = np.argsort(chords, kind='stable')
+        order = order[np.argsort(queries[order], kind='stable')]
+        queries, points, chords = queries[order], points[order], chords[order]
+        firsts = np.r_[0, np.flatnonzero(np.diff(queries)) + 1]
+        sizes = np.diff(np.r_[firsts, len(queries)])
+        ranks = np.arange(len(queries)) - np.repeat(firsts, sizes)
+        return queries, points, chords, ranks
+
+    def query_points(self, lats, lngs, k=1):
+        """
+        the k nearest points to each of arrays of latitudes and
+        longitudes. returns (Q, k) arrays of distances in miles and point
+        indices, nearest first, padded with inf and -1 when fewer than k
+        points are indexed. the distance to the kth point of the node
+        nearest each query with at least k points bounds the search
+
+        """
+        xyz = get_xyz(lats, lngs)
+        chords = np.full((len(xyz), k), np.inf)
+        indices = np.full((len(xyz), k), -1, dtype=np.int64)
+        n = len(self.xyz)
+        found = min(k, n)
+        # the deepest level at which every node holds at least k points
+        depth = min(self.depth, int(np.log2(n // found)))
+        for first in range(0, len(xyz), QUERY_BLOCK):
+            block = xyz[first:first + QUERY_BLOCK]
+            bounds = np.full(len(block), np.inf)
+            q, p, c, rank = self.get_pairs(block, *self.expand(
+                np.arange(len(block)), self.descend(block, depth)), bounds)
+            bounds[q[rank == found - 1]] = c[rank == found - 1]
+            q, leaves, bounds = self.tighten(
+                block, *self.search(block, bounds), bounds, found)
+            q, p, c, rank = self.get_pairs(
+                block, *self.expand(q, leaves), bounds)
+            keep = rank < found
+            chords[first + q[keep], rank[keep]] = c[keep]
+            indices[first + q[keep], rank[keep]] = p[keep]
+        return np.where(indices < 0, np.inf, get_miles(chords)), indices
+
+    def query(self, lat: float, lng: float, k=1):
+        """
+        the k nearest points to a latitude and longitude, as arrays of
+        distances in miles and point indices, nearest first
+
+        """
+        distances, indices = self.query_points([lat], [lng], k)
+        return distances[0], indices[0]
+
+    def query_radius_points(self, lats, lngs, miles: float):
+        """
+        the points within miles of each of arrays of latitudes and
+        longitudes. the results of all queries are returned together as
+        offsets, indices and distances in miles, where the points of query
+        i, nearest first, are indices[offsets[i]:offsets[i + 1]]
+
+        """
+        xyz = get_xyz(lats, lngs)
+        radius = get_chord(miles)
+        counts = np.zeros(len(xyz), dtype=np.int64)
+        points, chords = [], []
+        for first in range(0, len(xyz), QUERY_BLOCK):
+            block = xyz[first:first + QUERY_BLOCK]
+            bounds = np.full(len(block), radius)
+            q, p, c, rank = self.get_pairs(
+                block, *self.expand(*self.search(block, bounds)), bounds)
+            counts[first:first + len(block)] = np.bincount(
+                q, minlength=len(block))
+            points.append(p)
+            chords.append(c)
+        return (np.r_[0, np.cumsum(counts)], np.concatenate(points),
+                get_miles(np.concatenate(chords)))
+
+    def query_radius(self, lat: float, lng: float, miles: float):
+        """
+        the points within miles of a latitude and longitude, as arrays of
+        point indices and distances in miles, nearest first
+
+        """
+        offsets, indices, distances = self.query_radius_points(
+            [lat], [lng], miles)
+        return indices, distances
+
+    def save(self, file_name: str):
+        """ save the points and tree of the index to an .npz file """
+        order, starts, ends, lo, hi = self.get_tree()
+        with open(file_name, 'wb') as f:
+            np.savez(f, lats=self.lats, lngs=self.lngs, order=order,
+                     starts=starts, ends=ends, lo=lo, hi=hi)
+
+
+def load_index(file_name: str) -> PointIndex:
+    """
+    read an index saved by PointIndex.save. the arrays are memory mapped
+    so only the pages used by queries are read from disk
+
+    """
+    import geocache
+
+    try:
+        arrays = geocache.read_npz(file_name)
+    except (FileNotFoundError):
+        raise SystemExit('File ' + file_name + ' not found.')
+    return PointIndex(arrays['lats'], arrays['lngs'], tree=(
+        arrays['order'], arrays['starts'], arrays['ends'], arrays['lo'],
+        arrays['hi']))
@@ -3,7 +3,10 @@
 # data so that locations can be visualised on a map. this
 # creates single point geometry format based on latitude and
 # longitude data, specified in WGS 84 decimal degrees, for
-# each record in the CDR input file.
+# each record in the CDR input file, or with a grid one
+# feature for each occupied cell of the grid, with the
+# number of records, total duration and estimated distinct
+# callers of the cell.
 #
 # GeoJSON format: https://tools.ietf.org/html/rfc7946
 # GeoJSONLint:    http://geojsonlint.com/
@@ -11,158 +14,644 @@
 #
 # https://github.com/FixTheCode CC0 1.0 Universal
 # -----------------------------------------------------------
+import os
+import re
 import csv
 import sys
 import json
+import locale
 import argparse
+import textwrap
+import multiprocessing
+
+import numpy as np
 
 import geo
+import geohash
+import geogrid
 
 
-def main():
+# number of rows validated and converted together
+BLOCK_SIZE = 10000
 
-    def get_property(name: str, value: str, last=False) -> str:
-        """
-        returns a GeoJSON property field. apply a different format if the
-        field is the last one
+# size of the byte ranges of the input converted by each task with --workers
+CHUNK_SIZE = 32 * 1024 * 1024
 
-        """
-        response = '"' + name + '":"' + value + '"'
-        if last:
-            response += '},'
-        else:
-            response += ','
-        return (response.strip('\n'))
+# size of the blocks read when scanning the input for quotes and newlines
+SCAN_SIZE = 1024 * 1024
 
-    def get_geometry(x0: float, y0: float, last=False) -> str:
-        """
-        returns a GeoJSON geometry field. apply a different format if the
-        field is the last one
+# JSON integers, which json.loads reads as int rather than float
+INTEGER = re.compile(r'-?(0|[1-9][0-9]*)')
 
-        """
-        response = '"geometry": {"type":"Point","coordinates": [' + \
-            y0 + ',' + x0 + ']}}'
-        if not last:
-            response += ','
-        return (response.strip('\n'))
+# the start, separator of features, end and output without features of
+# each output layout: a minimised FeatureCollection, one formatted the same
+# as json.dumps with indent=4, a GeoJSON text sequence (RFC 8142) with a
+# record separator before each feature and newline delimited JSON
+LAYOUTS = {
+    'geojson': ('{"type": "FeatureCollection","features": [', ',',
+                ']}\n\n', '{"type": "FeatureCollection","features": []}\n\n'),
+    'pretty': ('{\n    "type": "FeatureCollection",\n    "features": [\n',
+               ',\n', '\n    ]\n}\n',
+               '{\n    "type": "FeatureCollection",\n    "features": []\n}\n'),
+    'geojsonseq': ('\x1e', '\n\x1e', '\n', ''),
+    'ndjson': ('', '\n', '\n', '')
+}
+
+# the C string escaping used by json.dumps, without its per call overhead
+get_string = json.encoder.encode_basestring_ascii
+
+
+def get_number(value: str) -> str:
+    """
+    returns a coordinate as a JSON number, written as json.dumps writes the
+    value json.loads reads from it
+
+    """
+    if INTEGER.fullmatch(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def get_feature(properties: dict, x0: str, y0: str, pretty=False) -> str:
+    """
+    returns a GeoJSON point feature of a dict of JSON property names and
+    values, as minimised text or formatted the same as json.dumps with
+    indent=4 at the depth of a feature in a FeatureCollection. GeoJSON
+    requires the coordinates ordered as longitude, latitude
+
+    """
+    if not pretty:
+        return ('{"type":"Feature","properties":{' +
+                ','.join([name + ':' + value
+                          for name, value in properties.items()]) +
+                '},"geometry": {"type":"Point","coordinates": [' +
+                get_number(y0) + ',' + get_number(x0) + ']}}')
+    if properties:
+        fields = ('{\n' + ',\n'.join(['                ' + name + ': ' + value
+                                      for name, value in properties.items()])
+                  + '\n            }')
+    else:
+        fields = '{}'
+    return ('        {\n            "type": "Feature",\n            '
+            '"properties": ' + fields + ',\n            "geometry": {\n'
+            '                "type": "Point",\n                "coordinates": '
+            '[\n                    ' + get_number(y0) + ',\n'
+            '                    ' + get_number(x0) + '\n                ]\n'
+            '            }\n        }')
+
+
+def get_cell_feature(properties: dict, bounds: tuple, point=False,
+                     pretty=False) -> str:
+    """
+    returns a GeoJSON feature of a grid cell with a dict of properties,
+    the south, north, west and east edges of the cell as a Polygon or, with
+    point, the centre of the cell as a Point. the feature is minimised or
+    formatted the same as json.dumps with indent=4 at the depth of a
+    feature in a FeatureCollection
+
+    """
+    south, north, west, east = (round(edge, 9) for edge in bounds)
+    if point:
+        geometry = {'type': 'Point',
+                    'coordinates': [round((west + east) / 2, 9),
+                                    round((south + north) / 2, 9)]}
+    else:
+        # the exterior ring of a polygon is anticlockwise
+        geometry = {'type': 'Polygon',
+                    'coordinates': [[[west, south], [east, south],
+                                     [east, north], [west, north],
+                                     [west, south]]]}
+    feature = {'type': 'Feature', 'properties': properties,
+               'geometry': geometry}
+    if pretty:
+        return textwrap.indent(json.dumps(feature, indent=4), ' ' * 8)
+    return json.dumps(feature, separators=(',', ':'))
+
+
+class FeatureWriter:
+    """
+    streaming writer of a GeoJSON FeatureCollection or sequence of features
+    in one of the LAYOUTS. features are written to the output a block at a
+    time as they are converted, each after a separator but the first, so
+    the output is never held in memory and the last feature does not need
+    to be known in advance. the formatted output is the same as json.dumps
+    with indent=4 of the whole collection
 
-    def validate_file(file_name: str, x: int, y: int):
+    """
+
+    def __init__(self, output, layout='geojson'):
+        self.output = output
+        self.pretty = layout == 'pretty'
+        self.start, self.separator, self.end, self.empty = LAYOUTS[layout]
+        self.features = 0
+
+    def write(self, features: list):
+        """ write a block of features formatted by get_feature """
+        self.write_fragment(self.separator.join(features), len(features))
+
+    def write_fragment(self, fragment: str, features: int):
         """
-        validate that the field positions specified on the command line are
-        valid and that each coordinate at the specified positions are valid
-        WGS 84 format
+        write a number of features already joined by the separator, such as
+        the features of a chunk of the input converted by a worker
 
         """
-        invalid_rows = ''
+        if not features:
+            return
+        self.output.write((self.separator if self.features else self.start) +
+                          fragment)
+        self.features += features
+
+    def close(self):
+        """ end the FeatureCollection or sequence """
+        self.output.write(self.end if self.features else self.empty)
+        self.output.flush()
+
+
+class InputError(ValueError):
+    """ an error in the input file that stops the conversion """
+
+
+def read_lines(f, end=None):
+    """
+    yield the lines of a binary input file up to the byte offset end,
+    checking that each is encoded as expected as it is decoded. lines are
+    decoded one at a time so an error is found at the same line whichever
+    part of the file is being read
+
+    """
+    encoding = locale.getpreferredencoding(False)
+    position = f.tell()
+    for line in f:
+        if end is not None and position >= end:
+            return
+        position += len(line)
+        if b'\0' in line:
+            raise InputError('error: input file is not ASCII or ANSI encoded.')
+        try:
+            yield line.decode(encoding)
+        except (UnicodeError):
+            raise InputError('error: input file is not ASCII or ANSI encoded.')
 
-        # check if file is encoded as expected
-        if '\0' in open(file_name).read():
-            print('error: input file is not ASCII or ANSI encoded.')
-            sys.exit(-1)
 
-        f = open(file_name, 'r')
-        reader = csv.DictReader(f)
-        fields = reader.fieldnames
+def read_blocks(reader, first_line=0):
+    """
+    yield the rows of a csv reader BLOCK_SIZE at a time, with the line
+    number each row ends on counting from first_line. blank lines are
+    skipped. the rows read before an error in the input are yielded before
+    the error is raised
+
+    """
+    rows, line_nums = [], []
+    try:
         for row in reader:
-            # print(row)
-            try:
-                a = int(x, 10) - 1
-                b = int(y, 10) - 1
-            except ValueError:
-                print('error: -x and -y must be integers.')
-                sys.exit(-1)
-            try:
-                x0 = row[fields[a]]
-                y0 = row[fields[b]]
-                float(x0)
-                float(y0)
-                if not geo.is_valid_coordinate(float(x0), float(y0)):
-                    invalid_rows += 'Row ' + str(reader.line_num) + \
-                        ' invalid WGS 84 coordinate ' + \
-                        str(x0) + ', ' + str(y0) + '\n'
-            except ValueError:
-                print(
+            if row:
+                rows.append(row)
+                line_nums.append(first_line + reader.line_num)
+                if len(rows) == BLOCK_SIZE:
+                    yield rows, line_nums
+                    rows, line_nums = [], []
+    except (InputError):
+        if rows:
+            yield rows, line_nums
+        raise
+    if rows:
+        yield rows, line_nums
+
+
+def init_worker(options: dict):
+    """
+    set the conversion options, the field positions, property names,
+    output format and prepared boundary, of the process. workers are given
+    them once rather than with every chunk
+
+    """
+    global conversion
+    conversion = options
+
+
+def get_coordinates(rows: list) -> tuple:
+    """
+    returns the latitudes and longitudes of a block of rows and the error
+    of the first value that is not a number, if any. such a value means
+    the field positions given on the command line are wrong, so the
+    conversion stops and only the coordinates of the rows before it are
+    returned
+
+    """
+    x, y = conversion['x'], conversion['y']
+    lats, lngs = np.empty(len(rows)), np.empty(len(rows))
+    for i, row in enumerate(rows):
+        x0 = row[x] if x < len(row) else ''
+        y0 = row[y] if y < len(row) else ''
+        try:
+            lats[i] = float(x0)
+            lngs[i] = float(y0)
+        except ValueError:
+            return (lats[:i], lngs[:i],
                     'error: check values for -x and -y are correct. field ' +
-                    str(x) +
-                    ' = ' +
-                    str(x0) +
-                    ' field ' +
-                    str(y) +
-                    ' = ' +
-                    str(y0))
-                sys.exit(-1)
+                    str(x + 1) + ' = ' + str(x0) + ' field ' + str(y + 1) +
+                    ' = ' + str(y0))
+    return (lats, lngs, None)
 
-        if len(invalid_rows) > 0:
-            print(invalid_rows)
-            sys.exit(-1)
 
+def get_durations(rows: list) -> tuple:
     """
-    open specified csv file to process and scan to check that all the geo
-    coordinates are valid. if validation passes we have a file with valid
-    WGS 84 format coordinates and we will be able to output a GeoJSON
-    representation
+    returns the durations of a block of rows and the error of the first
+    value that is not a number, if any. only the durations of the rows
+    before it are returned
 
     """
-    validate_file(args.i, args.x, args.y)
-    try:
-        f = open(args.i, 'r')
-        total_rows = sum(1 for row in f)
-        f.seek(0)
-        rawData = csv.DictReader(f)
-        current_field = 0
-    except (FileNotFoundError):
-        raise SystemExit(
-            f'File ' + args.i + ' not found.')
+    duration = conversion['duration']
+    durations = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        value = row[duration] if duration < len(row) else ''
+        try:
+            durations[i] = float(value)
+        except ValueError:
+            return (durations[:i],
+                    'error: check value for --duration is correct. field ' +
+                    str(duration + 1) + ' = ' + str(value))
+    return (durations, None)
+
 
+def validate_block(rows: list, line_nums: list, lats, lngs):
     """
-    create GeoJSON from the input file.  coordinate fields are skipped when
-    creating the properties for a row and used to create the geometry section
-    once all other fields have been processed.  GeoJSON requires the
-    coordinates ordered as longitude, latitude
-
-    """
-    output = '{"type": "FeatureCollection","features": ['
-    header = rawData.fieldnames
-    x = (int(args.x, 10)) - 1
-    y = (int(args.y, 10)) - 1
-    for row in rawData:
-        x0 = row[header[x]]
-        y0 = row[header[y]]
-        output += '{"type":"Feature","properties":{'
-        while current_field <= len(header):
-            if current_field == x or current_field == y:
-                current_field += 1
-            elif current_field == len(header) - 3:
-                output += get_property(header[current_field],
-                                       row[header[current_field]], True)
-            elif current_field == len(header):
-                if rawData.line_num != total_rows:
-                    output += get_geometry(x0, y0)
-                else:
-                    output += get_geometry(x0, y0, True)
-            else:
-                output += get_property(header[current_field],
-                                       row[header[current_field]])
-            current_field += 1
-        current_field = 0
-    output += ']}\n'
+    validate that each coordinate of a block of rows is a valid WGS 84
+    coordinate and, when a boundary is given, lies within the boundary.
+    the coordinates of the block are tested together. returns a mask of
+    the valid rows and the error of each invalid row in row order
+
+    """
+    x, y = conversion['x'], conversion['y']
+    boundary = conversion['boundary']
+    valid = geo.is_valid_coordinates(lats, lngs)
+    inside = valid.copy()
+    if boundary is not None and valid.any():
+        inside[valid] = geo.get_boundary_mask(lats[valid], lngs[valid],
+                                              boundary)
+    errors = []
+    for i in np.flatnonzero(~inside).tolist():
+        if not valid[i]:
+            errors.append('Row ' + str(line_nums[i]) +
+                          ' invalid WGS 84 coordinate ' +
+                          str(rows[i][x]) + ', ' + str(rows[i][y]) + '\n')
+        else:
+            errors.append('Row ' + str(line_nums[i]) + ' coordinate ' +
+                          str(lats[i]) + ', ' + str(lngs[i]) +
+                          ' not within boundary of ' +
+                          conversion['boundary_name'] + '\n')
+    return (inside, errors)
 
+
+def convert_block(rows: list, line_nums: list) -> tuple:
     """
-    output a formatted or minimised GeoJSON file. it is possible that the
-    incorrect specified field positions for coordinates return a valid type
-    that results in a malfored string.
+    convert a block of rows to GeoJSON features. coordinate fields are
+    skipped when creating the properties for a row and used to create the
+    geometry section.  a Geohash property of the coordinate is added last
+    when a precision is given, in place of any Geohash field of the input.
+    property names and values are escaped as JSON strings, and names
+    repeated in the header keep their last value as json.loads would.
+
+    with a grid the valid rows are added to the cells of the grid, with
+    their duration and caller when those fields are given, instead.
+
+    returns the features of the valid rows, the errors of the invalid rows
+    and the error that stops the conversion, if any: a value that is not a
+    number or, with fail_fast, the first invalid row. only the rows before
+    the one that stops the conversion are converted
 
     """
+    lats, lngs, stop = get_coordinates(rows)
+    grid = conversion['grid']
+    if grid is not None and conversion['duration'] is not None:
+        durations, duration_stop = get_durations(rows[:len(lats)])
+        if duration_stop:
+            stop = duration_stop
+            lats, lngs = lats[:len(durations)], lngs[:len(durations)]
+    rows = rows[:len(lats)]
+    valid, errors = validate_block(rows, line_nums, lats, lngs)
+    if errors and conversion['fail_fast']:
+        stop = errors[0]
+        valid[np.argmin(valid):] = False
+        errors = []
+    if grid is not None:
+        caller = conversion['caller']
+        grid.add(lats[valid], lngs[valid],
+                 None if conversion['duration'] is None else durations[valid],
+                 None if caller is None else
+                 [rows[i][caller] if caller < len(rows[i]) else ''
+                  for i in np.flatnonzero(valid).tolist()])
+        return ([], errors, stop)
+    if conversion['geohash'] and len(lats):
+        codes = geohash.encode(lats, lngs, conversion['geohash']).tolist()
+    x, y = conversion['x'], conversion['y']
+    names, fields = conversion['names'], conversion['fields']
+    features = []
+    for i in np.flatnonzero(valid).tolist():
+        row = rows[i]
+        properties = {names[j]: get_string(row[j] if j < len(row) else '')
+                      for j in fields}
+        if conversion['geohash']:
+            properties['"Geohash"'] = get_string(codes[i])
+        features.append(get_feature(properties, row[x], row[y],
+                                    conversion['pretty']))
+    return (features, errors, stop)
+
 
-    if not args.m:
+def convert_rows(f, end=None, first_line=0):
+    """
+    yield the features, errors and stopping error, as returned by
+    convert_block, of each block of the rows of a binary input file up to
+    the byte offset end. rows are numbered from first_line. an error in
+    the encoding of the input stops the conversion after the rows before it
+
+    """
+    reader = csv.reader(read_lines(f, end))
+    blocks = read_blocks(reader, first_line)
+    while True:
         try:
-            parsed = json.loads(output)
-            output = json.dumps(parsed, indent=4)
-        except BaseException:
-            print(
-                'invalid JSON. check that -x and -y were correct. run with -m to see output.')
-            sys.exit(-1)
-    print(output)
+            block = next(blocks, None)
+        except (InputError) as e:
+            yield ([], [], str(e))
+            return
+        if block is None:
+            return
+        features, errors, stop = convert_block(*block)
+        yield (features, errors, stop)
+        if stop:
+            return
+
+
+def get_cell_features(grid) -> list:
+    """
+    yield the features of the occupied cells of a grid BLOCK_SIZE cells at
+    a time, in the order of their keys. each has the name of the cell, the
+    number of rows in it and, when the fields are given, the total
+    duration and estimated number of distinct callers of the rows
+
+    """
+    keys, counts, durations, callers = grid.get_cells()
+    for first in range(0, len(keys), BLOCK_SIZE):
+        block = keys[first:first + BLOCK_SIZE]
+        bounds = np.stack(grid.get_bounds(block), axis=1).tolist()
+        features = []
+        for i, label in enumerate(grid.get_labels(block)):
+            properties = {'Cell': label, 'Count': int(counts[first + i])}
+            if conversion['duration'] is not None:
+                duration = float(durations[first + i])
+                properties['Duration'] = (int(duration) if
+                                          duration.is_integer() else duration)
+            if conversion['caller'] is not None:
+                properties['Callers'] = int(round(callers[first + i]))
+            features.append(get_cell_feature(
+                properties, bounds[i], conversion['grid_points'],
+                conversion['pretty']))
+        yield features
+
+
+def scan_range(task: tuple) -> tuple:
+    """ count the quotes and newlines in a byte range of a file """
+    file_name, start, end = task
+    quotes = newlines = 0
+    with open(file_name, 'rb') as f:
+        f.seek(start)
+        while start < end:
+            data = f.read(min(SCAN_SIZE, end - start))
+            if not data:
+                break
+            quotes += data.count(b'"')
+            newlines += data.count(b'\n')
+            start += len(data)
+    return (quotes, newlines)
+
+
+def find_record_start(f, start: int, quotes: int) -> tuple:
+    """
+    the offset of the first record that starts at or after a byte offset
+    of a csv file, given the number of quotes before the offset, and the
+    number of newlines skipped to reach it. a record starts after a newline
+    with an even number of quotes before it, as a newline inside a quoted
+    field follows an odd number. escaped quotes are written twice so do
+    not change the count
+
+    """
+    f.seek(start)
+    newlines = 0
+    while True:
+        data = f.read(SCAN_SIZE)
+        if not data:
+            return (start, newlines)
+        chars = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(chars == 10)
+        counts = quotes + np.cumsum(chars == 34)
+        records = ends[counts[ends] % 2 == 0]
+        if len(records):
+            return (start + int(records[0]) + 1,
+                    newlines + int(np.count_nonzero(ends <= records[0])))
+        quotes = int(counts[-1])
+        newlines += len(ends)
+        start += len(data)
+
+
+def convert_chunk(chunk: tuple) -> tuple:
+    """
+    convert the records of a byte range of the input in a worker. the
+    range is moved forward to the start of the first record starting in
+    it, and ends where the next range starts. returns the features joined
+    by their separator, or with a grid the cells of the rows of the range,
+    the number of features, the errors of invalid rows and the error that
+    stops the conversion, if any
+
+    """
+    file_name, start, end, quotes, end_quotes, first_line = chunk
+    separator = conversion['separator']
+    fragments, count, errors, stop = [], 0, [], None
+    grid = conversion['grid']
+    if grid is not None:
+        # each range has a grid of its own, merged in order by main
+        grid = conversion['grid'] = grid.empty()
+    with open(file_name, 'rb') as f:
+        if end is not None:
+            end = find_record_start(f, end, end_quotes)[0]
+        if quotes is not None:
+            start, newlines = find_record_start(f, start, quotes)
+            first_line += newlines
+        if end is not None and start >= end:
+            return ('' if grid is None else grid, 0, [], None)
+        f.seek(start)
+        for features, block_errors, stop in convert_rows(f, end, first_line):
+            if features:
+                fragments.append(separator.join(features))
+                count += len(features)
+            errors += block_errors
+            if stop:
+                break
+    return (separator.join(fragments) if grid is None else grid, count,
+            errors, stop)
+
+
+def get_chunks(file_name: str, start: int, first_line: int,
+               workers: int) -> list:
+    """
+    split the input after the header into byte ranges of CHUNK_SIZE and
+    count the quotes and newlines before each range in parallel, so every
+    worker can find the records of its range. returns the tasks of
+    convert_chunk
+
+    """
+    size = os.path.getsize(file_name)
+    starts = list(range(start, size, CHUNK_SIZE)) or [start]
+    ranges = [(file_name, s, min(s + CHUNK_SIZE, size)) for s in starts]
+    with multiprocessing.Pool(workers) as pool:
+        counts = pool.map(scan_range, ranges)
+    chunks = []
+    quotes, newlines = 0, first_line
+    for i, (name, s, e) in enumerate(ranges):
+        last = i == len(ranges) - 1
+        chunks.append((file_name, s, None if last else e,
+                       None if i == 0 else quotes,
+                       None if last else quotes + counts[i][0], newlines))
+        quotes += counts[i][0]
+        newlines += counts[i][1]
+    return chunks
+
+
+def main():
+
+    """
+    read the specified csv file in a single pass. each block of rows is
+    checked for its encoding, its coordinates are validated as valid WGS 84
+    coordinates, within the boundary when one is given, and the valid rows
+    are converted to GeoJSON features and written as soon as they are
+    converted. all invalid rows are reported on stderr once the file has
+    been read, or with --fail-fast the conversion stops at the first
+    invalid row and the output holds the rows before it.  with --workers
+    the file is split into byte ranges that are converted in parallel and
+    written in order, giving the same output.
+    with a grid the valid rows are added to the cells of the grid as they
+    are read, and a feature of each occupied cell is written once the file
+    has been read
+
+    """
+    try:
+        x = int(args.x, 10) - 1
+        y = int(args.y, 10) - 1
+        workers = int(args.workers or 1)
+        duration = int(args.duration, 10) - 1 if args.duration else None
+        caller = int(args.caller, 10) - 1 if args.caller else None
+    except ValueError:
+        print('error: -x, -y, --workers, --duration and --caller must be '
+              'integers.', file=sys.stderr)
+        sys.exit(-1)
+    if args.geohash:
+        try:
+            geohash.check_precision(args.geohash)
+        except ValueError as e:
+            raise SystemExit('error: ' + str(e) + '.')
+    grids = [(unit, size) for unit, size in (
+        ('degrees', args.grid_degrees), ('meters', args.grid_meters),
+        ('geohash', args.grid_geohash)) if size]
+    grid = None
+    if len(grids) > 1:
+        raise SystemExit('error: only one of --grid-degrees, --grid-meters '
+                         'and --grid-geohash can be given.')
+    if grids:
+        if args.geohash:
+            raise SystemExit('error: --geohash adds a property to the feature '
+                             'of each row and cannot be used with a grid.')
+        try:
+            grid = geogrid.CellGrid(*grids[0])
+        except ValueError as e:
+            raise SystemExit('error: ' + str(e) + '.')
+    boundary = None
+    if args.b:
+        boundary = geo.load_boundary(
+            args.b, meters=int(args.boundary_tolerance or 0),
+            conservative=args.boundary_outer)
+        if boundary.simplification:
+            print(geo.format_simplification_report(
+                boundary.simplification), file=sys.stderr)
+    try:
+        f = open(args.i, 'rb')
+    except (FileNotFoundError):
+        raise SystemExit(
+            f'File ' + args.i + ' not found.')
+    reader = csv.reader(read_lines(f))
+    try:
+        header = next(reader, [])
+    except (InputError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(-1)
+    # the header is read a line at a time so the file is positioned at the
+    # first record
+    first_line = reader.line_num
+    # the fields of gencdr.py are found by name when not given
+    if duration is None and 'Duration' in header:
+        duration = header.index('Duration')
+    if caller is None and 'Customer Identifier' in header:
+        caller = header.index('Customer Identifier')
+
+    # features of a sequence are always written on a single line
+    layout = args.format
+    if layout == 'geojson' and not args.m:
+        layout = 'pretty'
+    fields = [i for i in range(len(header)) if i != x and i != y]
+    if args.geohash:
+        # a Geohash field of the input is replaced rather than repeated
+        fields = [i for i in fields if header[i] != 'Geohash']
+    options = {
+        'x': x,
+        'y': y,
+        'fields': fields,
+        'names': [get_string(name) for name in header],
+        'geohash': args.geohash,
+        'pretty': layout == 'pretty',
+        'separator': LAYOUTS[layout][1],
+        'boundary': boundary,
+        'boundary_name': args.b,
+        'fail_fast': args.fail_fast,
+        'grid': grid,
+        'grid_points': args.grid_points,
+        'duration': duration,
+        'caller': caller
+    }
+    writer = FeatureWriter(sys.stdout, layout)
+    invalid_rows = ''
+    stop = None
+    init_worker(options)
+    if workers > 1:
+        chunks = get_chunks(args.i, f.tell(), first_line, workers)
+        f.close()
+        with multiprocessing.Pool(workers, init_worker, (options,)) as pool:
+            for fragment, count, errors, stop in pool.imap(convert_chunk,
+                                                           chunks):
+                if grid is not None:
+                    grid.merge(fragment)
+                else:
+                    writer.write_fragment(fragment, count)
+                invalid_rows += ''.join(errors)
+                if stop:
+                    break
+    else:
+        for features, errors, stop in convert_rows(f, None, first_line):
+            writer.write(features)
+            invalid_rows += ''.join(errors)
+        f.close()
+
+    if stop:
+        # the features written before the stop are still ended, so the
+        # output is a complete document
+        writer.close()
+        print(stop, file=sys.stderr)
+        sys.exit(-1)
+    if grid is not None:
+        for features in get_cell_features(grid):
+            writer.write(features)
+    writer.close()
+
+    if len(invalid_rows) > 0:
+        print(invalid_rows, file=sys.stderr)
+        sys.exit(-1)
 
 
 if __name__ == '__main__':
@@ -187,6 +676,75 @@ if __name__ == '__main__':
         required=True,
         metavar="INT",
         help='position of longitude field in file')
+    parser.add_argument(
+        '--format',
+        default='geojson',
+        choices=['geojson', 'geojsonseq', 'ndjson'],
+        help='a FeatureCollection, a GeoJSON text sequence (RFC 8142) or '
+             'one feature per line')
+    parser.add_argument(
+        '--workers',
+        required=False,
+        metavar="INT",
+        help='number of processes used to convert the file')
+    parser.add_argument(
+        '--fail-fast',
+        action='store_true',
+        help='stop at the first invalid row rather than report them all')
+    parser.add_argument(
+        '--geohash',
+        required=False,
+        metavar="INT",
+        help='add a Geohash property of this precision to each feature')
+    parser.add_argument(
+        '--grid-degrees',
+        required=False,
+        metavar="FLOAT",
+        help='write a feature for each occupied cell of a grid of cells of '
+             'this many degrees rather than each row')
+    parser.add_argument(
+        '--grid-meters',
+        required=False,
+        metavar="INT",
+        help='write a feature for each occupied cell of a grid of cells '
+             'about this many meters across')
+    parser.add_argument(
+        '--grid-geohash',
+        required=False,
+        metavar="INT",
+        help='write a feature for each occupied geohash cell of this '
+             'precision')
+    parser.add_argument(
+        '--grid-points',
+        action='store_true',
+        help='write the centre of each grid cell as a Point rather than '
+             'the cell as a Polygon')
+    parser.add_argument(
+        '--duration',
+        required=False,
+        metavar="INT",
+        help='position of the duration field totalled for each grid cell, '
+             'the Duration field by default')
+    parser.add_argument(
+        '--caller',
+        required=False,
+        metavar="INT",
+        help='position of the caller field counted for each grid cell, the '
+             'Customer Identifier field by default')
+    parser.add_argument(
+        '-b',
+        required=False,
+        metavar="FILE",
+        help='check every coordinate is within this GeoJSON boundary')
+    parser.add_argument(
+        '--boundary-tolerance',
+        required=False,
+        metavar="METERS",
+        help='simplify the boundary to within this many meters')
+    parser.add_argument(
+        '--boundary-outer',
+        action='store_true',
+        help='simplify the boundary conservatively so it only grows')
     args = parser.parse_args()
 
     main()